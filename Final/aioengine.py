@@ -0,0 +1,725 @@
+"""
+The controller on one asyncio event loop.
+
+    python aioengine.py [--host 0.0.0.0] [--port 5000] [--checkpoint-dir DIR]
+
+engine.py runs each simulation on its own thread, starts another thread for
+every arm or feeder move, keeps the feeder alarms on an AlarmService thread,
+and serves HTTP from Flask's worker threads; they all meet in shared dicts.
+This runtime does the same work as tasks on a single loop:
+
+  * a clock task per running enclosure, pacing a simulator.CycleStepper with
+    a PacingClock (the same tick logic as simulation_loop);
+  * a MotionController per servo, playing the motion.py trapezoid profiles
+    with asyncio.sleep between samples.  The arm's new targets replace any
+    pending one, feeder routines queue behind each other;
+  * one DisplayWriter for the OLED, which only ever draws the latest frame;
+  * the feeder's wall-clock alarms (AsyncAlarms, same rules as alarms.py);
+  * the HTTP API: the JSON routes of app.py (status, events, start/end,
+    seek, change-settings, adding and removing enclosures) with the same
+    replies, on aiohttp if it is
+    installed, otherwise on a small HTTP/1.1 server built on
+    asyncio.start_server.  Plots stay with app.py.
+
+Blocking device I/O (PWM writes, OLED frames, checkpoint closes) goes to a
+ThreadPoolExecutor of IO_WORKERS threads, so the loop never waits on
+hardware.  Tasks only switch at awaits, so a tick runs start to finish
+without locks and ticks, moves and requests interleave in a fixed order.
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import functools
+import json
+import os
+import signal
+import time
+import traceback
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+
+from PIL import Image
+
+from alarms import next_occurrence, MISFIRE_GRACE_S, MAX_WAIT_S
+from checkpoint import (
+    Checkpointer,
+    checkpoint_path,
+    load_checkpoint,
+    saved_enclosures,
+    CHECKPOINT_DIR_ENV,
+)
+from enclosures import SimulationManager, feed_timer, status_report
+from eventlog import EventLog, BinarySink
+from motion import trapezoid, writes, PROFILE_DT
+from pacing import PacingClock
+from tickstats import TickStats
+from simulator import (
+    CycleStepper,
+    seek_time,
+    servo_for,
+    drop_feeder,
+    shake_feeder,
+    drop_alarm,
+    feeding_alarm,
+    _oled_driver,
+    DEFAULT_HARDWARE,
+    ARM_DUTY_SPAN,
+    FEEDER_DUTY_SPAN,
+    FEEDER_HOME_ANGLE,
+    MAX_SIM_STEP,
+    US_PER_S,
+    US_PER_MINUTE,
+    EVENT_LOG_PATH,
+    TICK_STATS_PATH,
+)
+from engine import DEFAULT_ENCLOSURE
+
+IO_WORKERS        = 2       # threads for blocking device and file I/O
+REQUEST_TIMEOUT_S = 10.0    # built-in HTTP server: max time to read a request
+MAX_BODY_BYTES    = 64 * 1024   # larger request bodies get 413
+
+# simulator's feeder routines as MotionController moves (target, delay, step)
+FEEDER_MOVES = {
+    drop_feeder:   [(120, 0.05, 1)],
+    shake_feeder:  [(80, 0.05, 5), (120, 0.05, 5), (FEEDER_HOME_ANGLE, 0.05, 1)],
+    drop_alarm:    [(120, 0.05, 1)],
+    feeding_alarm: [(FEEDER_HOME_ANGLE, 0.05, 1)],
+}
+
+
+class MotionController:
+    """Plays moves of one ServoChannel on the loop, one at a time."""
+
+    def __init__(self, servo, executor):
+        self.servo     = servo
+        self._executor = executor
+        self._moves    = collections.deque()
+        self._wake     = asyncio.Event()
+        self._idle     = asyncio.Event()
+        self._idle.set()
+        self._task     = None
+
+    @property
+    def busy(self):
+        return not self._idle.is_set()
+
+    def retarget(self, target, delay=0.05, step=1):
+        """Go to `target` once the current move ends, dropping pending ones."""
+        self._moves.clear()
+        self.enqueue((target, delay, step))
+
+    def enqueue(self, *moves):
+        """Queue (target, delay, step) moves behind the pending ones."""
+        self._moves.extend(moves)
+        self._idle.clear()
+        self._wake.set()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def wait_idle(self):
+        await self._idle.wait()
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while self._moves:
+                try:
+                    await self.move(*self._moves.popleft())
+                except Exception as exc:  # a failed write mustn't kill the controller
+                    print(f"[Motion] PWM channel {self.servo.pwm_channel}: {exc!r}")
+                    self._moves.clear()
+            self._idle.set()
+
+    async def move(self, end_angle, delay=0.05, step=1):
+        """ServoChannel.move with awaited deadlines and off-loop writes."""
+        loop  = asyncio.get_running_loop()
+        servo = self.servo
+        write = functools.partial(loop.run_in_executor, self._executor, servo.set_angle)
+        start_angle = servo.angle
+        await write(start_angle)
+        if delay <= 0:
+            await write(end_angle)
+            return
+        t0 = loop.time()
+        profile = trapezoid(start_angle, end_angle, abs(step) / delay, servo.accel)
+        for k, angle in writes(profile, start_angle):
+            await asyncio.sleep(max(0.0, t0 + k * PROFILE_DT - loop.time()))
+            await write(angle)
+
+
+class DisplayWriter:
+    """Fills the OLED with the latest requested colour, off the loop."""
+
+    def __init__(self, disp, executor):
+        self.disp      = disp
+        self._executor = executor
+        self._color    = None
+        self._wake     = asyncio.Event()
+        self._task     = None
+
+    def show(self, color):
+        """Fill with '#RRGGBB' (None clears); only the latest request is drawn."""
+        self._color = color
+        self._wake.set()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            try:
+                await loop.run_in_executor(self._executor, self._draw, self._color)
+            except Exception as exc:
+                print(f"[Display] {exc!r}")
+
+    def _draw(self, color):
+        if color is None:
+            self.disp.clear()
+            return
+        img = Image.new('RGB', (self.disp.width, self.disp.height), color)
+        self.disp.ShowImage(self.disp.getbuffer(img))
+
+
+class AsyncAlarms:
+    """alarms.AlarmService as one task per alarm on the loop, same rules."""
+
+    def __init__(self, now=datetime.datetime.now, log=print):
+        self._now   = now
+        self._log   = log
+        self._tasks = {}
+        self._due   = {}
+
+    def set_daily(self, name, hhmm, action):
+        """(Re)arm alarm `name` to call `action()` on the loop every day at `hhmm`."""
+        self.cancel(name)
+        self._tasks[name] = asyncio.get_running_loop().create_task(
+            self._daily(name, hhmm, action))
+
+    def cancel(self, name):
+        self._due.pop(name, None)
+        task = self._tasks.pop(name, None)
+        if task is not None:
+            task.cancel()
+        return task is not None
+
+    def pending(self, prefix=""):
+        """Armed alarms whose name starts with `prefix`, soonest first."""
+        live = sorted((due, name) for name, due in self._due.items() if name.startswith(prefix))
+        return [{"name": name, "due": due.isoformat(timespec="minutes")} for due, name in live]
+
+    async def _daily(self, name, hhmm, action):
+        due = next_occurrence(hhmm, self._now())
+        while True:
+            self._due[name] = due
+            now  = self._now()
+            wait = (due - now).total_seconds()
+            if wait > 0:
+                # bounded so a wall-clock step (NTP on an RTC-less Pi) is noticed
+                await asyncio.sleep(min(wait, MAX_WAIT_S))
+                continue
+            due = next_occurrence(hhmm, max(now, due))
+            if -wait > MISFIRE_GRACE_S:
+                self._log(f"[Alarms] {name} missed ({-wait:.0f} s late), next one tomorrow")
+                continue
+            try:
+                action()
+            except Exception as exc:
+                self._log(f"[Alarms] {name} failed: {exc!r}")
+
+
+class AsyncEngine:
+    """One enclosure's runs as a task on the loop; LocalEngine's interface."""
+
+    def __init__(self, host, name=DEFAULT_ENCLOSURE):
+        self.host      = host
+        self.name      = name
+        self._task     = None
+        self._run      = None
+        self._shared   = {'snapshot': None}
+        self._stopping = False
+        self._keep     = False
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done() and not self._stopping
+
+    def start(self, run, resume=None):
+        """Start `run`; with `resume` (see checkpoint.py) from that point."""
+        if self.running:
+            return False
+        self._run      = run
+        self._shared   = {'snapshot': None}
+        self._stopping = False
+        self._keep     = False
+        self._task = asyncio.get_running_loop().create_task(self._cycle(run, resume))
+        self._task.add_done_callback(self._cycle_done)
+        return True
+
+    def _cycle_done(self, task):
+        # the start request has long been answered: a run that dies is
+        # logged here, and running turns False with the task
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[Engine] {self.name!r} simulation failed:")
+            traceback.print_exception(task.exception())
+
+    def resume(self):
+        """
+        Restart the run saved in this enclosure's checkpoint, if any; return
+        that run, or None.
+        """
+        if not self.host.checkpoint_dir or self.running:
+            return None
+        saved = load_checkpoint(checkpoint_path(self.host.checkpoint_dir, self.name))
+        if saved is None:
+            return None
+        run, resume = saved
+        self.set_feed_alarms(run)
+        print(f"[Engine] resuming {self.name!r} at sim time {resume['sim_time']:%Y-%m-%d %H:%M} "
+              f"(saved at {resume['saved_sim_time']:%Y-%m-%d %H:%M}, checkpoint from "
+              f"{resume['written_at']})")
+        return run if self.start(run, resume) else None
+
+    def stop(self, keep_checkpoint=False):
+        """Stop the run; its checkpoint is deleted unless keep_checkpoint."""
+        if not self.running:
+            return False
+        self._keep     = keep_checkpoint
+        self._stopping = True
+        self._task.cancel()
+        return True
+
+    async def join(self):
+        """Wait until a stopped run has parked its hardware."""
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    def seek(self, target):
+        if not self.running:
+            return None
+        sim_time = seek_time(self._run['cycle_start_date'], self._run['user_cycle_length'],
+                             target.get('day'), target.get('time_of_day'),
+                             target.get('progress'))
+        # picked up by the clock task at the top of its next tick
+        self._shared['seek'] = sim_time
+        return sim_time
+
+    def snapshot(self):
+        return self._shared['snapshot']
+
+    def tick_stats(self):
+        stats = self._shared.get('tick_stats')
+        return stats.summary() if stats is not None else None
+
+    def status(self):
+        # no await in between: all four come from the same point on the loop
+        return {'running':    self.running,
+                'snapshot':   self.snapshot(),
+                'tick_stats': self.tick_stats(),
+                'alarms':     self.feed_alarms()}
+
+    def events(self, n=None, category=None):
+        log = self._shared.get('events')
+        return log.recent(n, category) if log is not None else []
+
+    def set_feed_alarms(self, timer):
+        hardware = dict(DEFAULT_HARDWARE, **(timer.get('hardware') or {}))
+        feeder   = self.host.motion(servo_for(hardware['feeder_channel'], FEEDER_DUTY_SPAN,
+                                              FEEDER_HOME_ANGLE))
+        alarms = self.host.alarms
+        if timer['independent_timer']:
+            alarms.set_daily(f"{self.name}:drop", timer['drop_countdown'],
+                             functools.partial(feeder.enqueue, *FEEDER_MOVES[drop_alarm]))
+            alarms.set_daily(f"{self.name}:end", timer['end_feed_countdown'],
+                             functools.partial(feeder.enqueue, *FEEDER_MOVES[feeding_alarm]))
+        else:
+            alarms.cancel(f"{self.name}:drop")
+            alarms.cancel(f"{self.name}:end")
+
+    def feed_alarms(self):
+        return self.host.alarms.pending(f"{self.name}:")
+
+    async def _cycle(self, run, resume):
+        loop     = asyncio.get_running_loop()
+        host     = self.host
+        shared   = self._shared
+        hardware = dict(DEFAULT_HARDWARE, **(run.get('hardware') or {}))
+        arm      = servo_for(hardware['arm_channel'], ARM_DUTY_SPAN, 0)
+        feeder   = servo_for(hardware['feeder_channel'], FEEDER_DUTY_SPAN, FEEDER_HOME_ANGLE)
+        if resume is not None:
+            # the servos carry on from where they were instead of jumping
+            arm.angle, feeder.angle = resume['arm_angle'], resume['feeder_angle']
+            shared['seek'] = resume['sim_time']
+        arm_motion    = host.motion(arm)
+        feeder_motion = host.motion(feeder)
+        try:
+            display = await host.display() if hardware['display'] else None
+        except Exception as exc:
+            # nothing has moved yet: log why and end as not running
+            print(f"[Engine] {self.name!r} not started, display unavailable: {exc}")
+            self._stopping = True
+            return
+
+        checkpoint = None
+        if host.checkpoint_dir:
+            checkpoint = Checkpointer(checkpoint_path(host.checkpoint_dir, self.name), run)
+        events = shared['events'] = EventLog(
+            sink=BinarySink(EVENT_LOG_PATH) if EVENT_LOG_PATH else None,
+            sim_epoch=run['cycle_start_date'])
+        tick_stats = shared['tick_stats'] = TickStats()
+
+        stepper = CycleStepper(
+            run['schedule'], run['cycle_start_date'], run['user_cycle_length'],
+            run['hex_color'], run['feed_start_time'], run['feed_end_time'],
+            run['independent_timer'], events, arm, feeder,
+            arm_busy=lambda: arm_motion.busy,
+            move_arm=arm_motion.retarget,
+            feed=lambda action: feeder_motion.enqueue(*FEEDER_MOVES[action]),
+            show=display.show if display is not None else lambda color: None,
+            shared_state=shared, checkpoint=checkpoint)
+
+        # the same 1/100 sim-minute base tick as simulation_loop, on the
+        # stepper's integer clock
+        real_secs_per_update = (run['day_length_in_real_seconds'] / (24 * 60.0)
+                                / 100.0 / run['speed_factor'])
+        clock  = stepper.clock
+        sim_us = 0
+        pacer  = PacingClock(sim_us, US_PER_MINUTE // 100, real_secs_per_update,
+                             max_tick_sim=MAX_SIM_STEP // datetime.timedelta(microseconds=1))
+        try:
+            while True:
+                seek_to = shared.pop('seek', None)
+                if seek_to is not None:
+                    sim_us = clock.to_us(seek_to)
+                    pacer.rebase(sim_us)
+                    stepper.seek(sim_us)
+
+                tick_start = time.monotonic()
+                stepper.step(sim_us)
+                body_s = time.monotonic() - tick_start
+                pacer.adapt(body_s)
+                sim_us, skipped, wait_s = pacer.advance()
+                await asyncio.sleep(wait_s)
+                late = pacer.lateness()
+                tick_stats.record_tick(
+                    body_s      = body_s,
+                    overshoot_s = late if not skipped else None,
+                    drift_s     = late,
+                    period_s    = pacer.tick_real_s,
+                    skipped     = skipped,
+                    step_s      = pacer.tick_sim / US_PER_S,
+                )
+        finally:
+            # stop() cancelled us (or the stepper failed): park the hardware
+            # like simulation_loop does on exit
+            if display is not None:
+                display.show(None)
+            arm_motion.retarget(0)
+            feeder_motion.retarget(FEEDER_HOME_ANGLE)
+            await asyncio.gather(arm_motion.wait_idle(), feeder_motion.wait_idle())
+            if checkpoint is not None:
+                # an engine shutdown keeps the checkpoint to resume from on
+                # boot, a stop asked for by the user throws it away
+                if self._keep:
+                    checkpoint.update(clock.to_datetime(sim_us), arm.angle, feeder.angle,
+                                      force=True)
+                await loop.run_in_executor(host.executor, checkpoint.close, not self._keep)
+            events.log('sim', "Tick timing: %s", sim_us, json.dumps(tick_stats.summary()))
+            events.log('sim', "Exiting…", sim_us)
+            events.close()
+            if TICK_STATS_PATH:
+                tick_stats.dump(TICK_STATS_PATH)
+
+
+class AsyncEngineHost:
+    """The AsyncEngines of this loop, sharing servos, display, alarms and I/O threads."""
+
+    def __init__(self, checkpoint_dir=None, io_workers=IO_WORKERS):
+        self.checkpoint_dir = checkpoint_dir
+        self.executor       = ThreadPoolExecutor(io_workers, thread_name_prefix="moonlight-io")
+        self.alarms         = AsyncAlarms()
+        self._engines       = {}
+        self._motion        = {}
+        self._display       = None
+
+    def get(self, name=DEFAULT_ENCLOSURE):
+        if name not in self._engines:
+            self._engines[name] = AsyncEngine(self, name)
+        return self._engines[name]
+
+    def motion(self, servo):
+        """The one MotionController of `servo`, whichever run or alarm moves it."""
+        if servo not in self._motion:
+            self._motion[servo] = MotionController(servo, self.executor)
+        return self._motion[servo]
+
+    async def display(self):
+        if self._display is None:
+            oled = _oled_driver()
+            if oled is None:
+                raise RuntimeError("waveshare_OLED driver is not installed")
+            disp = oled.OLED_1in27_rgb()
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.executor, disp.Init)
+            await loop.run_in_executor(self.executor, disp.clear)
+            self._display = DisplayWriter(disp, self.executor)
+        return self._display
+
+    def resume_all(self):
+        """
+        Resume every enclosure that has a checkpoint (at boot); return
+        {name: run} of the ones that were resumed.
+        """
+        if not self.checkpoint_dir:
+            return {}
+        resumed = {name: self.get(name).resume() for name in saved_enclosures(self.checkpoint_dir)}
+        return {name: run for name, run in resumed.items() if run is not None}
+
+    async def stop_all(self):
+        """Park everything for shutdown; checkpoints stay for the next boot."""
+        stopped = [e for e in self._engines.values() if e.stop(keep_checkpoint=True)]
+        await asyncio.gather(*(e.join() for e in stopped))
+
+
+# ---- HTTP API --------------------------------------------------------------
+class HttpApi:
+    """app.py's JSON routes over a SimulationManager, for either HTTP server."""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.routes  = {
+            ("GET",  "status"):           self.status,
+            ("GET",  "events"):           self.events,
+            ("GET",  "start-simulation"): self.start_sim,
+            ("GET",  "end-simulation"):   self.end_sim,
+            ("POST", "seek"):             self.seek,
+            ("POST", "change-settings"):  self.change_settings,
+        }
+
+    def dispatch(self, method, target, body):
+        """(status, payload) for one request; `target` is the path and query."""
+        try:
+            return self._route(method, target, body)
+        except Exception:
+            # like Flask: log it, answer 500 and keep serving
+            print(f"[HTTP] {method} {target} failed:")
+            traceback.print_exc()
+            return 500, {"error": "Internal server error"}
+
+    def _route(self, method, target, body):
+        url   = urllib.parse.urlsplit(target)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        parts = [urllib.parse.unquote(p) for p in url.path.strip("/").split("/")]
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            return 400, {"error": "Body must be JSON."}
+        data = data if isinstance(data, dict) else {}
+        if parts == ["enclosures"] and method == "GET":
+            return 200, {name: {"hardware": self.manager.get(name).hardware,
+                                "running":  self.manager.get(name).engine.running}
+                         for name in self.manager.names()}
+        if parts == ["enclosures"] and method == "POST":
+            return self.add_enclosure(data)
+        if len(parts) == 2 and parts[0] == "enclosures" and method == "DELETE":
+            return self.remove_enclosure(parts[1])
+        if len(parts) == 3 and parts[0] == "enclosures":
+            name, action = parts[1], parts[2]
+        elif len(parts) == 1:
+            name, action = DEFAULT_ENCLOSURE, parts[0]
+        else:
+            return 404, {"error": "Not found"}
+        handler = self.routes.get((method, action))
+        if handler is None:
+            return 404, {"error": "Not found"}
+        try:
+            enc = self.manager.get(name)
+        except KeyError:
+            return 404, {"error": f"No enclosure named {name!r}"}
+        return handler(enc, query, data)
+
+    def add_enclosure(self, data):
+        name = data.get("name")
+        if not name:
+            return 400, {"error": "Enclosure name is required."}
+        try:
+            self.manager.add(name, data.get("settings"), data.get("hardware"))
+        except ValueError as exc:
+            return 400, {"error": str(exc)}
+        return 200, {"message": f"Enclosure {name!r} added."}
+
+    def remove_enclosure(self, name):
+        try:
+            self.manager.remove(name)
+        except KeyError:
+            return 404, {"error": f"No enclosure named {name!r}"}
+        return 200, {"message": f"Enclosure {name!r} removed."}
+
+    def status(self, enc, query, data):
+        return 200, status_report(enc)
+
+    def events(self, enc, query, data):
+        try:
+            n = int(query["n"]) if "n" in query else None
+        except ValueError:
+            n = None
+        return 200, enc.engine.events(n, query.get("category"))
+
+    def start_sim(self, enc, query, data):
+        engine = enc.engine
+        if engine.running:
+            return 200, {"message": "Simulation already running."}
+        run = self.manager.build_run(enc)
+        engine.set_feed_alarms(feed_timer(enc))
+        if not engine.start(run):
+            return 200, {"message": "Simulation already running."}
+        return 200, {"message": "Simulation started!"}
+
+    def end_sim(self, enc, query, data):
+        if not enc.engine.stop():
+            return 200, {"message": "Simulation was not running."}
+        return 200, {"message": "Simulation ending…"}
+
+    def seek(self, enc, query, data):
+        if data.get("progress") is not None:
+            target = {"progress": data["progress"]}
+        elif data.get("day") is not None:
+            target = {"day": data["day"], "time_of_day": data.get("time")}
+        else:
+            return 400, {"error": "Give a day (and optional time) or a progress."}
+        try:
+            sim_time = enc.engine.seek(target)
+        except (ValueError, TypeError) as exc:
+            return 400, {"error": f"Invalid seek target: {exc}"}
+        if sim_time is None:
+            return 200, {"message": "Simulation is not running."}
+        return 200, {"message": "Seeking…", "sim_time": sim_time.isoformat(timespec="minutes")}
+
+    def change_settings(self, enc, query, data):
+        try:
+            self.manager.update_settings(enc, data)
+        except ValueError as exc:
+            return 400, {"error": str(exc)}
+        return 200, {"message": "Settings updated successfully!"}
+
+    # -- servers ---------------------------------------------------------------
+    async def start(self, host, port):
+        """Listen on host:port; returns a coroutine function that stops it."""
+        try:
+            from aiohttp import web
+        except ImportError:
+            print("[HTTP] aiohttp not installed, using the built-in asyncio server")
+            server = await asyncio.start_server(self._handle_connection, host, port)
+            async def close():
+                server.close()
+                await server.wait_closed()
+            return close
+
+        async def handler(request):
+            try:
+                body = await request.read()
+            except web.HTTPRequestEntityTooLarge:
+                status, payload = 413, _TOO_LARGE
+            else:
+                status, payload = self.dispatch(request.method, request.path_qs, body)
+            return web.json_response(payload, status=status, dumps=_dumps)
+
+        app = web.Application(client_max_size=MAX_BODY_BYTES)
+        app.router.add_route("*", "/{tail:.*}", handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        print(f"[HTTP] aiohttp on {host}:{port}")
+        return runner.cleanup
+
+    async def _handle_connection(self, reader, writer):
+        # one request per connection (Connection: close), enough for the UI
+        try:
+            method, target, body = await asyncio.wait_for(_read_request(reader),
+                                                          REQUEST_TIMEOUT_S)
+            status, payload = self.dispatch(method, target, body)
+        except _BodyTooLarge:
+            status, payload = 413, _TOO_LARGE
+        except (ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            status, payload = 400, {"error": "Bad request"}
+        data = _dumps(payload).encode()
+        writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n"
+                     f"Connection: close\r\n\r\n".encode("latin-1") + data)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+        writer.close()
+
+
+_dumps = functools.partial(json.dumps, default=str)
+
+_TOO_LARGE = {"error": f"Request body over {MAX_BODY_BYTES} bytes."}
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+async def _read_request(reader):
+    method, target, _ = (await reader.readline()).decode("latin-1").split(" ", 2)
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        if key.strip().lower() == "content-length":
+            length = int(value)
+    if length > MAX_BODY_BYTES:
+        raise _BodyTooLarge()
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, body
+
+
+async def serve(host, port, checkpoint_dir=None, io_workers=IO_WORKERS):
+    """Run the engines and the HTTP API until SIGTERM/SIGINT."""
+    engines = AsyncEngineHost(checkpoint_dir, io_workers)
+    manager = SimulationManager(engines.get)
+    manager.add(DEFAULT_ENCLOSURE)
+    # before serving, so a rebooted tank is back on its cycle right away and
+    # the API knows those enclosures and the settings they run with
+    names = manager.adopt(engines.resume_all())
+    if names:
+        print(f"[Engine] resumed enclosures: {', '.join(names)}")
+    close_http = await HttpApi(manager).start(host, port)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    await close_http()
+    # park the arms and feeders before the process goes away
+    await engines.stop_all()
+    engines.executor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Moonlight controller on asyncio.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--io-workers", type=int, default=IO_WORKERS,
+                        help="threads for blocking hardware and file I/O")
+    parser.add_argument("--checkpoint-dir",
+                        help=f"save/resume running cycles here (default ${CHECKPOINT_DIR_ENV})")
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port,
+                      args.checkpoint_dir or os.environ.get(CHECKPOINT_DIR_ENV),
+                      args.io_workers))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Daily wall-clock alarms, used for the feeder's independent timer.
+
+simulation_loop used to compare datetime.now().strftime('%H:%M') against the
+drop/end times on every tick, so the feeder only worked while a simulation
+was running, an alarm could fire on several ticks of the same minute, and a
+tick longer than a minute could miss it.  AlarmService keeps a heap of due
+times on its own thread instead: each alarm fires once per day at its HH:MM
+whatever the simulation is doing, including not running at all.
+
+Due times are wall-clock (the alarms are "06:00 local"), but waits are
+bounded by MAX_WAIT_S so a wall-clock step (the Pi has no RTC and jumps when
+NTP syncs) is noticed.  An occurrence more than MISFIRE_GRACE_S late is
+skipped rather than fired at the wrong time; one that already fired is never
+repeated, even if the clock steps back over it.
+"""
+import datetime
+import heapq
+import itertools
+import threading
+
+MISFIRE_GRACE_S = 300
+MAX_WAIT_S      = 30.0
+
+
+def next_occurrence(hhmm, after):
+    """First datetime strictly after `after` whose time of day is `hhmm`."""
+    h, m = map(int, hhmm.split(':'))
+    due = after.replace(hour=h, minute=m, second=0, microsecond=0)
+    if due <= after:
+        due += datetime.timedelta(days=1)
+    return due
+
+
+class AlarmService:
+    def __init__(self, now=datetime.datetime.now, log=print):
+        self._now    = now
+        self._log    = log
+        self._heap   = []       # (due, seq, name); stale entries are skipped
+        self._alarms = {}       # name -> (seq, hhmm, action)
+        self._seq    = itertools.count()
+        self._cond   = threading.Condition()
+        self._thread = None
+
+    def set_daily(self, name, hhmm, action):
+        """(Re)arm alarm `name` to call `action()` every day at `hhmm`."""
+        due = next_occurrence(hhmm, self._now())
+        with self._cond:
+            seq = next(self._seq)
+            self._alarms[name] = (seq, hhmm, action)
+            heapq.heappush(self._heap, (due, seq, name))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def cancel(self, name):
+        with self._cond:
+            removed = self._alarms.pop(name, None) is not None
+            self._cond.notify()
+        return removed
+
+    def pending(self, prefix=""):
+        """Armed alarms whose name starts with `prefix`, soonest first."""
+        with self._cond:
+            live = [(due, name) for due, seq, name in self._heap
+                    if name.startswith(prefix) and self._alarms.get(name, (None,))[0] == seq]
+        return [{"name": name, "due": due.isoformat(timespec="minutes")}
+                for due, name in sorted(live)]
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._heap and self._alarms.get(self._heap[0][2], (None,))[0] != self._heap[0][1]:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait(MAX_WAIT_S)
+                    continue
+                due, seq, name = self._heap[0]
+                now  = self._now()
+                wait = (due - now).total_seconds()
+                if wait > 0:
+                    self._cond.wait(min(wait, MAX_WAIT_S))
+                    continue
+                heapq.heappop(self._heap)
+                _, hhmm, action = self._alarms[name]
+                heapq.heappush(self._heap, (next_occurrence(hhmm, max(now, due)), seq, name))
+                late = -wait
+
+            if late > MISFIRE_GRACE_S:
+                self._log(f"[Alarms] {name} missed ({late:.0f} s late), next one tomorrow")
+                continue
+            try:
+                action()
+            except Exception as exc:  # one bad action mustn't stop the other alarms
+                self._log(f"[Alarms] {name} failed: {exc!r}")
@@ -0,0 +1,201 @@
+"""
+Crash-safe checkpoints of a running simulation, so a reboot mid-cycle resumes
+where it was instead of starting a 28-day run over with the arm parked.
+
+One JSON file per enclosure in the checkpoint directory (MOONLIGHT_CHECKPOINT_DIR,
+or serve.py --checkpoint-dir) holds the run's arguments, its schedule with a
+fingerprint, the sim time, the arm and feeder angles, and the wall time it
+was written.  simulation_loop hands the dynamic part to a Checkpointer every
+tick; at most one write happens per CHECKPOINT_INTERVAL_S (plus one after a
+seek and one on shutdown), on the Checkpointer's own thread, so an SD card
+sees about one small write a minute and the loop never waits on fsync.
+
+Writes are atomic: a temp file in the same directory is fsynced and renamed
+over the old one, then the directory is fsynced.  After a crash the file is
+either the previous checkpoint or the new one, never a torn mix.  Stopping a
+simulation on purpose deletes its checkpoint; stopping because the engine is
+shutting down keeps it.
+
+A run resumes where it would be had the engine never gone down: the time
+between written_at and the load is added to sim_time at the run's pace
+(speed_factor sim days per day_length_in_real_seconds), clamped to the last
+minute of the cycle.
+"""
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+
+from simulator import ScheduleEntry
+
+CHECKPOINT_DIR_ENV    = "MOONLIGHT_CHECKPOINT_DIR"
+CHECKPOINT_INTERVAL_S = 60.0
+CHECKPOINT_VERSION    = 1
+
+_TIME_KEYS = ('moonrise_time', 'moonset_time')
+
+
+def checkpoint_path(directory, enclosure):
+    return os.path.join(directory, urllib.parse.quote(enclosure, safe="") + ".json")
+
+
+def write_atomic(path, data):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    dir_fd = os.open(os.path.dirname(path) or ".", os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def _encode_schedule(schedule):
+    return [{k: (v.isoformat() if k in _TIME_KEYS and v is not None else v)
+             for k, v in entry.items()} for entry in schedule]
+
+
+def _decode_schedule(entries):
+    return tuple(ScheduleEntry({k: (datetime.time.fromisoformat(v)
+                                    if k in _TIME_KEYS and v is not None else v)
+                                for k, v in entry.items()}) for entry in entries)
+
+
+def schedule_fingerprint(encoded_schedule):
+    blob = json.dumps(encoded_schedule, sort_keys=True).encode()
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+class Checkpointer:
+    """Batches checkpoint updates of one run and writes them off-thread."""
+
+    def __init__(self, path, run, interval_s=CHECKPOINT_INTERVAL_S):
+        self.path       = path
+        self.interval_s = interval_s
+        schedule = _encode_schedule(run['schedule'])
+        self._static = {
+            'version':     CHECKPOINT_VERSION,
+            'run':         dict({k: v for k, v in run.items() if k != 'schedule'},
+                                cycle_start_date=run['cycle_start_date'].isoformat()),
+            'schedule':    schedule,
+            'fingerprint': schedule_fingerprint(schedule),
+        }
+        self._pending  = None
+        self._closed   = False
+        self._next_due = 0.0
+        self._lock     = threading.Lock()
+        self._wake     = threading.Event()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._thread = threading.Thread(target=self._writer, daemon=True)
+        self._thread.start()
+
+    def due(self):
+        """True if update() would queue a checkpoint now."""
+        return time.monotonic() >= self._next_due
+
+    def update(self, sim_time, arm_angle, feeder_angle, force=False):
+        """Queue a checkpoint if one is due (or `force`); True if queued."""
+        now = time.monotonic()
+        if not force and now < self._next_due:
+            return False
+        self._next_due = now + self.interval_s
+        state = dict(self._static,
+                     written_at   = datetime.datetime.now().isoformat(),
+                     sim_time     = sim_time.isoformat(),
+                     arm_angle    = arm_angle,
+                     feeder_angle = feeder_angle)
+        with self._lock:
+            self._pending = state
+        self._wake.set()
+        return True
+
+    def close(self, discard=False):
+        """Flush (or with `discard`, drop and delete) and stop the writer."""
+        with self._lock:
+            self._closed = True
+            if discard:
+                self._pending = None
+        self._wake.set()
+        self._thread.join()
+        if discard:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def _writer(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            with self._lock:
+                state, self._pending = self._pending, None
+                closed = self._closed
+            if state is not None:
+                try:
+                    write_atomic(self.path, json.dumps(state).encode())
+                except OSError as exc:
+                    print(f"[Checkpoint] write to {self.path} failed: {exc}")
+            if closed:
+                return
+
+
+def caught_up(run, sim_time, written_at, now=None):
+    """
+    `sim_time`, saved at wall time `written_at`, advanced by the downtime
+    until `now` at the run's pace and clamped to the cycle (see seek_time).
+    """
+    now       = now or datetime.datetime.now()
+    downtime  = max(now - written_at, datetime.timedelta(0))   # clock set back
+    rate      = run['speed_factor'] * 86400.0 / run['day_length_in_real_seconds']
+    cycle_end = run['cycle_start_date'] + datetime.timedelta(days=run['user_cycle_length'])
+    return min(sim_time + downtime * rate, cycle_end - datetime.timedelta(minutes=1))
+
+
+def load_checkpoint(path, now=None):
+    """
+    (run, resume) from a checkpoint file, or None if there is none or it
+    can't be trusted.  `resume` has sim_time (caught up to `now`, default
+    the current time), saved_sim_time, arm_angle, feeder_angle and
+    written_at.
+    """
+    try:
+        with open(path, "rb") as f:
+            state = json.load(f)
+        if state.get('version') != CHECKPOINT_VERSION:
+            raise ValueError(f"unknown version {state.get('version')!r}")
+        if schedule_fingerprint(state['schedule']) != state['fingerprint']:
+            raise ValueError("schedule fingerprint mismatch")
+        run = dict(state['run'],
+                   cycle_start_date=datetime.datetime.fromisoformat(state['run']['cycle_start_date']),
+                   schedule=_decode_schedule(state['schedule']))
+        saved_sim_time = datetime.datetime.fromisoformat(state['sim_time'])
+        written_at     = datetime.datetime.fromisoformat(state['written_at'])
+        resume = {
+            'sim_time':       caught_up(run, saved_sim_time, written_at, now),
+            'saved_sim_time': saved_sim_time,
+            'arm_angle':      state['arm_angle'],
+            'feeder_angle':   state['feeder_angle'],
+            'written_at':     state['written_at'],
+        }
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError, TypeError) as exc:
+        print(f"[Checkpoint] ignoring {path}: {exc}")
+        return None
+    return run, resume
+
+
+def saved_enclosures(directory):
+    """Names of the enclosures with a checkpoint in `directory`."""
+    try:
+        files = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(urllib.parse.unquote(f[:-len(".json")])
+                  for f in files if f.endswith(".json"))
@@ -0,0 +1,117 @@
+"""
+Plot windows of the interactive CLI scripts (main.py, final_with_feeder.py,
+prototype.py).
+
+Windows are reused by title: running a plot again updates the artists of its
+open window in place (set_data) instead of opening another figure or
+redrawing this one from scratch.  At most MAX_PLOT_WINDOWS stay open; the
+least recently drawn one is closed first.  'pc' closes them all.
+
+While windows are open the command loop sleeps in the Tk event loop rather
+than polling it: a CommandQueue.put() or a window being closed writes to a
+pipe Tk watches, and that ends the loop.
+
+The scripts pick the GUI backend (TkAgg) before importing this module.
+"""
+import os
+import tkinter
+from queue import Queue, Empty
+
+import matplotlib.pyplot as plt
+
+MAX_PLOT_WINDOWS = int(os.environ.get("MOONLIGHT_MAX_PLOT_WINDOWS", 4))
+
+_windows = {}   # title -> artists dict of the plotter, least recently drawn first
+
+_wake_r, _wake_w = os.pipe()
+os.set_blocking(_wake_r, False)
+os.set_blocking(_wake_w, False)
+
+
+def _wake(*_):
+    try:
+        os.write(_wake_w, b'\0')
+    except BlockingIOError:
+        pass        # pipe full: a wakeup is pending anyway
+
+
+def _drain_wakeups():
+    try:
+        while os.read(_wake_r, 512):
+            pass
+    except BlockingIOError:
+        pass
+
+
+class CommandQueue(Queue):
+    """Queue of CLI commands whose put() also wakes next_command()."""
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        _wake()
+
+
+def plot_window(title, figsize):
+    """
+    (ax, artists) of the window called `title`.  `artists` is the plotter's
+    own dict, empty if the window was just opened: the plotter then draws the
+    whole plot and keeps what it will update there, otherwise it only sets
+    new data on those artists.
+    """
+    open_titles = plt.get_figlabels()
+    for stale in [t for t in _windows if t not in open_titles]:
+        del _windows[stale]          # closed by hand
+    artists = _windows.pop(title, None)
+    while len(_windows) >= MAX_PLOT_WINDOWS:
+        oldest = next(iter(_windows))
+        del _windows[oldest]
+        plt.close(oldest)
+    fig = plt.figure(title, figsize=figsize)
+    if artists is None:
+        fig.clear()
+        fig.add_subplot()
+        fig.canvas.mpl_connect('close_event', _wake)
+        artists = {}
+    _windows[title] = artists
+    return fig.axes[0], artists
+
+
+def show_plot(ax):
+    """Rescale `ax` to its (new) data and draw it without blocking."""
+    ax.relim()
+    ax.autoscale_view()
+    ax.figure.canvas.draw_idle()
+    plt.show(block=False)
+
+
+def close_plot_windows():
+    plt.close('all')
+    _windows.clear()
+
+
+def _run_gui_until_woken(canvas):
+    tk = canvas.get_tk_widget().tk
+    tk.createfilehandler(_wake_r, tkinter.READABLE,
+                         lambda fd, mask: canvas.stop_event_loop())
+    try:
+        canvas.start_event_loop(0)
+    finally:
+        tk.deletefilehandler(_wake_r)
+
+
+def next_command(command_queue):
+    """
+    Block until the next command of a CommandQueue.  While plot windows are
+    open their GUI events are run until a command arrives or a window is
+    closed; with none open this is a plain blocking get.
+    """
+    while plt.get_fignums():
+        canvas = plt.gcf().canvas
+        if not hasattr(canvas, 'get_tk_widget'):
+            break       # non-interactive backend: no GUI events to run
+        _drain_wakeups()
+        try:
+            return command_queue.get_nowait()
+        except Empty:
+            _run_gui_until_woken(canvas)
+    return command_queue.get()
@@ -0,0 +1,270 @@
+"""
+Several tanks ("enclosures") controlled from one process.
+
+Each Enclosure has its own settings dict (what app.py used to keep in its one
+global `state`), its own hardware channel mapping and its own engine, so N
+simulations can run side by side.  Schedules come from simulator.get_schedule,
+so enclosures with identical settings share one immutable schedule.  A
+schedule is only computed when something first needs it.
+
+The HTTP front ends (app.py, aioengine.py) share the settings, run and status
+logic below, so both answer with the same JSON.  Runs also carry the
+start_phase and start_time they were built from: an engine that resumes a
+checkpoint at boot hands its runs back (SimulationManager.adopt) and the
+enclosure's settings are restored from them.
+"""
+import datetime
+import re
+import threading
+
+from simulator import get_schedule, find_first_day_with_phase, DEFAULT_HARDWARE, LUNAR_PHASES
+
+DEFAULT_SETTINGS = {
+    "user_cycle_length":          28,        # now plain integer days
+    "speed_factor":               1.0,
+    "day_length_in_real_seconds": 86400,     # 24 h sim-day in real seconds
+    "hex_color":                  "FF0000",
+    "feed_start_time":            "19:00",
+    "feed_end_time":              "04:00",
+    "start_phase":                "Full Moon",
+    "start_time":                 "00:00",
+
+    "independent_timer":          False,
+    "drop_countdown":             "06:00",
+    "end_feed_countdown":         "08:00",
+}
+
+# settings that (re)arm the engine's wall-clock feeder alarms when changed
+FEED_TIMER_KEYS = {"independent_timer", "drop_countdown", "end_feed_countdown"}
+
+# settings given as "HH:MM"
+TIME_KEYS = ("feed_start_time", "feed_end_time", "start_time",
+             "drop_countdown", "end_feed_countdown")
+
+
+class Enclosure:
+    def __init__(self, name, engine, hardware, settings=None):
+        self.name     = name
+        self.engine   = engine
+        self.hardware = hardware
+        self.state    = dict(DEFAULT_SETTINGS)
+        self.state.update(settings or {})
+        self.state["cycle_start_date"] = datetime.datetime.now()
+        self.state["moon_schedule"]    = None
+
+
+class SimulationManager:
+    """Named enclosures, each with its own engine from `engine_factory(name)`."""
+
+    def __init__(self, engine_factory):
+        self._engine_factory = engine_factory
+        self._enclosures     = {}
+        self._lock           = threading.Lock()
+
+    def names(self):
+        return list(self._enclosures)
+
+    def get(self, name):
+        """Return the enclosure called `name`; KeyError if there is none."""
+        return self._enclosures[name]
+
+    def add(self, name, settings=None, hardware=None):
+        hardware = dict(DEFAULT_HARDWARE, **(hardware or {}))
+        if hardware["arm_channel"] == hardware["feeder_channel"]:
+            raise ValueError("Arm and feeder need different PWM channels.")
+        with self._lock:
+            if name in self._enclosures:
+                raise ValueError(f"Enclosure {name!r} already exists.")
+            for other in self._enclosures.values():
+                used = {other.hardware["arm_channel"], other.hardware["feeder_channel"]}
+                if used & {hardware["arm_channel"], hardware["feeder_channel"]}:
+                    raise ValueError(f"PWM channel already used by enclosure {other.name!r}.")
+                if hardware["display"] and other.hardware["display"]:
+                    raise ValueError(f"Display already used by enclosure {other.name!r}.")
+            enc = Enclosure(name, self._engine_factory(name), hardware, settings)
+            self._enclosures[name] = enc
+        return enc
+
+    def adopt(self, runs):
+        """
+        Register the enclosures in `runs` ({name: run} of what the engine is
+        running, e.g. resumed from checkpoints at boot) and restore their
+        settings and hardware from the runs.  The engine already drives that
+        hardware, so it is not checked against the other enclosures.
+        """
+        for name, run in runs.items():
+            with self._lock:
+                enc = self._enclosures.get(name)
+                if enc is None:
+                    enc = Enclosure(name, self._engine_factory(name), None)
+                    self._enclosures[name] = enc
+            enc.hardware = dict(DEFAULT_HARDWARE, **(run.get("hardware") or {}))
+            enc.state.update(settings_from_run(run))
+        return list(runs)
+
+    def remove(self, name):
+        with self._lock:
+            enc = self._enclosures.pop(name)
+        enc.engine.stop()
+        return enc
+
+    def refresh_schedule(self, enc):
+        """Point `enc` at the (cached) schedule matching its current settings."""
+        enc.state["moon_schedule"] = get_schedule(enc.state["user_cycle_length"],
+                                                  enc.state["start_phase"])
+        return enc.state["moon_schedule"]
+
+    def schedule(self, enc):
+        """`enc`'s schedule, computed on first use."""
+        if enc.state["moon_schedule"] is None:
+            return self.refresh_schedule(enc)
+        return enc.state["moon_schedule"]
+
+    def build_run(self, enc, now=None):
+        """
+        The run dict (see engine.py) for starting `enc` now: the schedule is
+        rebuilt and the cycle starts on the first day of the start phase, at
+        the start time.
+        """
+        state = enc.state
+        now = now or datetime.datetime.now()
+        try:
+            hh, mm = map(int, state["start_time"].split(":"))
+        except Exception:
+            hh, mm = 0, 0
+
+        self.refresh_schedule(enc)
+        day_offset   = find_first_day_with_phase(state["moon_schedule"], state["start_phase"])
+        sim_start_dt = (now + datetime.timedelta(days=day_offset)).replace(hour=hh, minute=mm)
+        return {
+            "schedule":                   state["moon_schedule"],
+            "cycle_start_date":           sim_start_dt,
+            "user_cycle_length":          state["user_cycle_length"],
+            "speed_factor":               state["speed_factor"],
+            "day_length_in_real_seconds": state["day_length_in_real_seconds"],
+            "hex_color":                  state["hex_color"],
+            "feed_start_time":            state["feed_start_time"],
+            "feed_end_time":              state["feed_end_time"],
+            "independent_timer":          state["independent_timer"],
+            "drop_countdown":             state["drop_countdown"],
+            "end_feed_countdown":         state["end_feed_countdown"],
+            "hardware":                   enc.hardware,
+            "start_phase":                state["start_phase"],
+            "start_time":                 state["start_time"],
+        }
+
+    def update_settings(self, enc, d):
+        """
+        Apply the settings in request body `d` to `enc`; ValueError with a
+        message for the user if any of them is invalid (nothing is changed
+        then).
+        """
+        state = dict(enc.state)
+        # only integer days now
+        if "cycle_length" in d:
+            try:
+                new_len = int(d["cycle_length"])
+            except (ValueError, TypeError):
+                raise ValueError("Cycle length must be an integer.") from None
+            if new_len < 1:
+                raise ValueError("Cycle length must be at least 1 day.")
+            state["user_cycle_length"] = new_len
+
+        for key in ("hex_color", "feed_start_time", "feed_end_time", "start_phase", "start_time"):
+            if d.get(key):
+                state[key] = d[key]
+        for key in FEED_TIMER_KEYS & d.keys():
+            state[key] = d[key]
+        if d.get("day_length") is not None:
+            state["day_length_in_real_seconds"] = d["day_length"]
+
+        # check the result before any of it reaches the enclosure, so a bad
+        # value can't leave it with settings it can't run
+        hex_color = str(state["hex_color"]).lstrip("#")
+        if not re.fullmatch(r"[0-9A-Fa-f]{6}", hex_color):
+            raise ValueError("Hex color must be six hex digits, e.g. FF0000.")
+        state["hex_color"] = hex_color.upper()
+        if state["start_phase"] not in LUNAR_PHASES:
+            raise ValueError(f"Unknown start phase {state['start_phase']!r}.")
+        for key in TIME_KEYS:
+            try:
+                datetime.datetime.strptime(state[key], "%H:%M")
+            except (ValueError, TypeError):
+                raise ValueError(f"{key} must be a time as HH:MM.") from None
+        day_length = state["day_length_in_real_seconds"]
+        if isinstance(day_length, bool) or not isinstance(day_length, (int, float)) or day_length <= 0:
+            raise ValueError("Day length must be a positive number of seconds.")
+
+        # rebuild schedule (shared with any enclosure using the same settings)
+        state["moon_schedule"]    = get_schedule(state["user_cycle_length"], state["start_phase"])
+        state["cycle_start_date"] = datetime.datetime.now()
+        enc.state = state
+
+        # the feeder timer runs on the engine's alarms whether or not a
+        # simulation is running, so changes apply right away
+        if FEED_TIMER_KEYS & d.keys():
+            enc.engine.set_feed_alarms(feed_timer(enc))
+
+
+def feed_timer(enc):
+    """The independent feeder timer settings the engine's alarms need."""
+    return {
+        "independent_timer":  enc.state["independent_timer"],
+        "drop_countdown":     enc.state["drop_countdown"],
+        "end_feed_countdown": enc.state["end_feed_countdown"],
+        "hardware":           enc.hardware,
+    }
+
+
+def settings_from_run(run):
+    """
+    The Enclosure.state `run` was built from (see build_run).  Checkpoints
+    written before runs carried start_phase/start_time fall back to the
+    first scheduled phase and the cycle start's time of day.
+    """
+    state = {key: run[key] for key in DEFAULT_SETTINGS if key in run}
+    state.setdefault("start_phase", run["schedule"][0]["phase"])
+    state.setdefault("start_time", f"{run['cycle_start_date']:%H:%M}")
+    state["cycle_start_date"] = run["cycle_start_date"]
+    state["moon_schedule"]    = run["schedule"]
+    return state
+
+
+def status_report(enc):
+    """The /status reply for `enc`."""
+    state = enc.state
+    # one engine read (one round trip to a remote engine): every field below
+    # comes from the same moment
+    status = enc.engine.status()
+    snap   = status["snapshot"]
+    if snap is not None:
+        dd, rem = divmod(int(snap.elapsed_s), 86400)
+        hh, rem = divmod(rem, 3600)
+        mm, ss = divmod(rem, 60)
+        sim_str = f"{dd:02}:{hh:02}:{mm:02}:{ss:02}"
+        progress, phase = snap.progress, snap.phase
+        phase_angle, altitude = snap.phase_angle, snap.altitude
+    else:
+        sim_str = "--:--:--:--"
+        progress, phase, phase_angle, altitude = 0.0, "N/A", 0.0, 0.0
+
+    return {
+        "Simulation Started": status["running"],
+        "Sim Time":           sim_str,
+        "Progress (%)":       round(progress, 2),
+        "Phase":              phase,
+        "Phase Angle":        round(phase_angle, 2),
+        "Altitude (deg)":     round(float(altitude), 1),
+        "Cycle Length":       state["user_cycle_length"],
+        "Hex Color":          state["hex_color"],
+        "Day Length (s)":     state["day_length_in_real_seconds"],
+        "Start Phase":        state["start_phase"],
+        "Start Time":         state["start_time"],
+        "Feed Start":         state["feed_start_time"],
+        "Feed End":           state["feed_end_time"],
+        "Independent Timer":  state["independent_timer"],
+        "Feed Start 1":       state["drop_countdown"],
+        "Feed End 1":         state["end_feed_countdown"],
+        "Tick Stats":         status["tick_stats"],
+        "Feeder Alarms":      status["alarms"],
+    }
@@ -0,0 +1,497 @@
+"""
+Boundary between the HTTP tier (app.py) and the simulation engine.
+
+app.py never starts simulation threads or reads simulation state itself; it
+talks to an engine object with this small interface:
+
+    start(run)   -> bool       start a run, False if one is already running
+    stop()       -> bool       stop the run, False if nothing was running
+    running      -> bool
+    snapshot()   -> SimSnapshot or None (latest status published by the loop)
+    tick_stats() -> dict or None (tick timing summary, see tickstats.py)
+    events(n, category) -> list of dicts (recent log events, see eventlog.py)
+    seek(target) -> datetime or None (jump the running sim, see below)
+    set_feed_alarms(timer)    arm/disarm the wall-clock feeder timer
+    feed_alarms() -> list of dicts (armed feeder alarms and when they're due)
+    status()     -> dict of running, snapshot, tick_stats and alarms, read
+                    together (one round trip for RemoteEngine)
+
+`target` is a dict for simulator.seek_time: {'day': n, 'time_of_day': "HH:MM"}
+or {'progress': percent}.  seek returns the new sim time, None if no
+simulation is running, and raises ValueError for a bad target.
+
+`timer` holds independent_timer, drop_countdown, end_feed_countdown and
+hardware.  Feeder alarms live on the engine's AlarmService (alarms.py), not in
+a run: they keep firing while no simulation is running and across restarts
+of the simulation.
+
+`run` is a plain dict holding the arguments of simulation_loop:
+
+    schedule, cycle_start_date, user_cycle_length, speed_factor,
+    day_length_in_real_seconds, hex_color, feed_start_time, feed_end_time,
+    independent_timer, drop_countdown, end_feed_countdown, hardware
+
+One engine process can run several enclosures (see enclosures.py): every
+request may carry an 'enclosure' name (default "default") and is routed to
+that enclosure's LocalEngine inside an EngineHost.
+
+LocalEngine runs the simulation on a thread in the current process (what
+`python app.py` uses).  RemoteEngine implements the same interface over a
+Unix socket served by serve_engine(), so the engine and the HTTP tier can
+live in different processes.  Running this module starts a standalone
+engine process:
+
+    MOONLIGHT_ENGINE_AUTHKEY=<key> python engine.py --socket /run/moonlight/engine.sock
+
+serve.py launches and supervises one of these next to the HTTP process and
+restarts it if it dies; the HTTP tier keeps answering (engine routes return
+503) until the new engine is listening.
+
+aioengine.py is a single-process alternative: AsyncEngine has this same
+interface but runs as a task on an asyncio loop, and that module serves the
+JSON routes itself.
+
+Wire format: multiprocessing.connection over AF_UNIX, authenticated with a
+shared key.  Every request is a dict {'cmd': name, 'enclosure': name, ...}
+answered by exactly one reply dict:
+
+    {'cmd': 'ping'}               -> {'ok': True}
+    {'cmd': 'runs'}               -> {'ok': True, 'runs': {enclosure: run}}
+    {'cmd': 'start', 'run': run}  -> {'ok': started}
+    {'cmd': 'stop'}               -> {'ok': stopped}
+    {'cmd': 'status'}             -> {'ok': True, 'running': bool,
+                                      'snapshot': SimSnapshot or None,
+                                      'tick_stats': dict or None,
+                                      'alarms': [dict, ...]}
+    {'cmd': 'set_alarms', 'timer': timer} -> {'ok': True}
+    {'cmd': 'seek', 'target': target}     -> {'ok': bool, 'sim_time': datetime or None}
+    {'cmd': 'events', 'n': int or None, 'category': str or None}
+                                  -> {'ok': True, 'events': [dict, ...]}
+
+'runs' covers every running enclosure (the 'enclosure' key is ignored), so
+an HTTP tier that starts after the engine resumed checkpoints can register
+those enclosures with their settings.
+
+Telemetry: {'cmd': 'subscribe', 'interval': seconds} turns the connection
+into a stream; the engine sends a status reply every `interval` seconds until
+the client disconnects.
+
+Unknown commands get {'ok': False, 'error': message}.
+"""
+import argparse
+import os
+import signal
+import sys
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+
+from alarms import AlarmService
+from checkpoint import (
+    Checkpointer,
+    checkpoint_path,
+    load_checkpoint,
+    saved_enclosures,
+    CHECKPOINT_DIR_ENV,
+)
+from simulator import (
+    simulation_loop,
+    seek_time,
+    set_feed_alarms,
+    servo_for,
+    DEFAULT_HARDWARE,
+    ARM_DUTY_SPAN,
+    FEEDER_DUTY_SPAN,
+    FEEDER_HOME_ANGLE,
+)
+
+# Environment variables used to point app.py at an engine in another process.
+ENGINE_SOCKET_ENV  = "MOONLIGHT_ENGINE_SOCKET"
+ENGINE_AUTHKEY_ENV = "MOONLIGHT_ENGINE_AUTHKEY"
+
+DEFAULT_ENCLOSURE = "default"
+
+
+class LocalEngine:
+    """Runs simulation_loop on a daemon thread in this process."""
+
+    def __init__(self, name=DEFAULT_ENCLOSURE, alarms=None, checkpoint_dir=None):
+        self.name           = name
+        self.alarms         = alarms if alarms is not None else AlarmService()
+        self.checkpoint_dir = checkpoint_dir   # None: no checkpoints
+        self._thread        = None
+        self._stop_event    = None
+        self._run           = None
+        self._shared        = {'snapshot': None}
+
+    @property
+    def running(self):
+        return (self._thread is not None and self._thread.is_alive()
+                and not self._stop_event.is_set())
+
+    def start(self, run, resume=None):
+        """Start `run`; with `resume` (see checkpoint.py) from that point."""
+        if self.running:
+            return False
+        self._stop_event = threading.Event()
+        self._run        = run
+        self._shared     = {'snapshot': None}
+        checkpoint = None
+        if self.checkpoint_dir:
+            checkpoint = Checkpointer(checkpoint_path(self.checkpoint_dir, self.name), run)
+        if resume is not None:
+            # the loop seeks there on its first tick; the servos carry on
+            # from where they were instead of jumping
+            hardware = dict(DEFAULT_HARDWARE, **(run.get('hardware') or {}))
+            servo_for(hardware['arm_channel'], ARM_DUTY_SPAN, 0).angle = resume['arm_angle']
+            servo_for(hardware['feeder_channel'], FEEDER_DUTY_SPAN,
+                      FEEDER_HOME_ANGLE).angle = resume['feeder_angle']
+            self._shared['seek'] = resume['sim_time']
+        self._thread = threading.Thread(
+            target=simulation_loop,
+            args=(
+                run['schedule'],
+                run['cycle_start_date'],
+                run['user_cycle_length'],
+                1,  # update_interval_minutes
+                run['speed_factor'],
+                run['day_length_in_real_seconds'],
+                run['hex_color'],
+                run['feed_start_time'],
+                run['feed_end_time'],
+                run['independent_timer'],
+                run['drop_countdown'],
+                run['end_feed_countdown'],
+                self._stop_event,
+                self._shared,
+                run.get('hardware'),
+            ),
+            kwargs={'checkpoint': checkpoint},
+            daemon=True
+        )
+        self._thread.start()
+        return True
+
+    def resume(self):
+        """
+        Restart the run saved in this enclosure's checkpoint, if any; return
+        that run, or None.
+        """
+        if not self.checkpoint_dir or self.running:
+            return None
+        saved = load_checkpoint(checkpoint_path(self.checkpoint_dir, self.name))
+        if saved is None:
+            return None
+        run, resume = saved
+        self.set_feed_alarms(run)
+        print(f"[Engine] resuming {self.name!r} at sim time {resume['sim_time']:%Y-%m-%d %H:%M} "
+              f"(saved at {resume['saved_sim_time']:%Y-%m-%d %H:%M}, checkpoint from "
+              f"{resume['written_at']})")
+        return run if self.start(run, resume) else None
+
+    def current_run(self):
+        """The run being simulated, None if nothing is running."""
+        return self._run if self.running else None
+
+    def stop(self, keep_checkpoint=False):
+        """Stop the run; its checkpoint is deleted unless keep_checkpoint."""
+        if not self.running:
+            return False
+        self._shared['keep_checkpoint'] = keep_checkpoint
+        self._stop_event.set()
+        return True
+
+    def seek(self, target):
+        if not self.running:
+            return None
+        sim_time = seek_time(self._run['cycle_start_date'], self._run['user_cycle_length'],
+                             target.get('day'), target.get('time_of_day'),
+                             target.get('progress'))
+        # picked up by the loop at the top of its next tick
+        self._shared['seek'] = sim_time
+        return sim_time
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def snapshot(self):
+        return self._shared['snapshot']
+
+    def tick_stats(self):
+        stats = self._shared.get('tick_stats')
+        return stats.summary() if stats is not None else None
+
+    def status(self):
+        # one reference to the run's shared dict, so a restart in between
+        # can't mix the snapshot of one run with the stats of the next
+        shared = self._shared
+        stats  = shared.get('tick_stats')
+        return {'running':    self.running,
+                'snapshot':   shared['snapshot'],
+                'tick_stats': stats.summary() if stats is not None else None,
+                'alarms':     self.feed_alarms()}
+
+    def events(self, n=None, category=None):
+        log = self._shared.get('events')
+        return log.recent(n, category) if log is not None else []
+
+    def set_feed_alarms(self, timer):
+        hardware = dict(DEFAULT_HARDWARE, **(timer.get('hardware') or {}))
+        feeder   = servo_for(hardware['feeder_channel'], FEEDER_DUTY_SPAN, FEEDER_HOME_ANGLE)
+        set_feed_alarms(self.alarms, self.name, timer['independent_timer'],
+                        timer['drop_countdown'], timer['end_feed_countdown'], feeder)
+
+    def feed_alarms(self):
+        return self.alarms.pending(f"{self.name}:")
+
+
+class EngineHost:
+    """The LocalEngines of one process, created on first use per enclosure."""
+
+    def __init__(self, checkpoint_dir=None):
+        self._engines       = {}
+        self._lock          = threading.Lock()
+        self.alarms         = AlarmService()    # one timer thread for every enclosure
+        self.checkpoint_dir = checkpoint_dir
+
+    def get(self, name=DEFAULT_ENCLOSURE):
+        with self._lock:
+            if name not in self._engines:
+                self._engines[name] = LocalEngine(name, self.alarms, self.checkpoint_dir)
+            return self._engines[name]
+
+    def resume_all(self):
+        """
+        Resume every enclosure that has a checkpoint (at boot); return
+        {name: run} of the ones that were resumed.
+        """
+        if not self.checkpoint_dir:
+            return {}
+        resumed = {name: self.get(name).resume() for name in saved_enclosures(self.checkpoint_dir)}
+        return {name: run for name, run in resumed.items() if run is not None}
+
+    def runs(self):
+        """{name: run} of every enclosure that is running."""
+        with self._lock:
+            engines = list(self._engines.values())
+        runs = {e.name: e.current_run() for e in engines}
+        return {name: run for name, run in runs.items() if run is not None}
+
+    def stop_all(self, timeout=None):
+        """Park everything for shutdown; checkpoints stay for the next boot."""
+        with self._lock:
+            engines = list(self._engines.values())
+        stopped = [e for e in engines if e.stop(keep_checkpoint=True)]
+        for e in stopped:
+            e.join(timeout)
+
+
+def handle_request(host, req):
+    """Dispatch one request dict against its enclosure and build the reply."""
+    cmd = req.get('cmd')
+    if cmd == 'ping':
+        return {'ok': True}
+    if cmd == 'runs':
+        return {'ok': True, 'runs': host.runs()}
+    engine = host.get(req.get('enclosure', DEFAULT_ENCLOSURE))
+    if cmd == 'start':
+        return {'ok': engine.start(req['run'])}
+    if cmd == 'stop':
+        return {'ok': engine.stop()}
+    if cmd == 'status':
+        return dict(engine.status(), ok=True)
+    if cmd == 'seek':
+        sim_time = engine.seek(req['target'])
+        return {'ok': sim_time is not None, 'sim_time': sim_time}
+    if cmd == 'set_alarms':
+        engine.set_feed_alarms(req['timer'])
+        return {'ok': True}
+    if cmd == 'events':
+        return {'ok': True, 'events': engine.events(req.get('n'), req.get('category'))}
+    return {'ok': False, 'error': f"Unknown command: {cmd!r}"}
+
+
+def _stream_telemetry(host, conn, req):
+    interval = max(0.05, float(req.get('interval', 1.0)))
+    status   = dict(req, cmd='status')
+    while True:
+        conn.send(handle_request(host, status))
+        time.sleep(interval)
+
+
+def _serve_connection(host, conn):
+    with conn:
+        while True:
+            try:
+                req = conn.recv()
+            except (EOFError, OSError):
+                return
+            if req.get('cmd') == 'subscribe':
+                try:
+                    _stream_telemetry(host, conn, req)
+                except (BrokenPipeError, ConnectionError, OSError):
+                    return
+            try:
+                reply = handle_request(host, req)
+            except Exception as exc:  # keep the engine alive on bad input
+                reply = {'ok': False, 'error': str(exc)}
+            conn.send(reply)
+
+
+def serve_engine(host, address, authkey, ready_event=None):
+    """Accept RemoteEngine connections on the Unix socket `address` forever."""
+    if os.path.exists(address):
+        os.unlink(address)
+    with Listener(address, family='AF_UNIX', authkey=authkey) as listener:
+        os.chmod(address, 0o600)
+        if ready_event is not None:
+            ready_event.set()
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                # failed handshake (wrong key, client went away); keep serving
+                continue
+            threading.Thread(target=_serve_connection, args=(host, conn),
+                             daemon=True).start()
+
+
+class EngineUnavailable(ConnectionError):
+    """The engine process is not reachable (not started, or restarting)."""
+
+
+class RemoteEngine:
+    """Client side of serve_engine(); same interface as LocalEngine."""
+
+    def __init__(self, address, authkey, enclosure=DEFAULT_ENCLOSURE):
+        self.address   = address
+        self.authkey   = authkey
+        self.enclosure = enclosure
+
+    def _call(self, cmd, **kwargs):
+        # one short-lived connection per call: safe to use from many Flask
+        # threads at once and transparently picks up a restarted engine
+        try:
+            with Client(self.address, family='AF_UNIX', authkey=self.authkey) as conn:
+                conn.send(dict(cmd=cmd, enclosure=self.enclosure, **kwargs))
+                reply = conn.recv()
+        except (OSError, EOFError) as exc:
+            raise EngineUnavailable(f"engine at {self.address} unavailable: {exc}") from exc
+        if 'error' in reply:
+            raise RuntimeError(reply['error'])
+        return reply
+
+    @property
+    def running(self):
+        return self._call('status')['running']
+
+    def start(self, run):
+        return self._call('start', run=run)['ok']
+
+    def stop(self):
+        return self._call('stop')['ok']
+
+    def snapshot(self):
+        return self._call('status')['snapshot']
+
+    def tick_stats(self):
+        return self._call('status')['tick_stats']
+
+    def events(self, n=None, category=None):
+        return self._call('events', n=n, category=category)['events']
+
+    def seek(self, target):
+        return self._call('seek', target=target)['sim_time']
+
+    def set_feed_alarms(self, timer):
+        self._call('set_alarms', timer=timer)
+
+    def feed_alarms(self):
+        return self._call('status')['alarms']
+
+    def status(self):
+        reply = self._call('status')
+        return {key: reply[key] for key in ('running', 'snapshot', 'tick_stats', 'alarms')}
+
+    def telemetry(self, interval=1.0):
+        """Yield status replies pushed by the engine every `interval` seconds."""
+        try:
+            with Client(self.address, family='AF_UNIX', authkey=self.authkey) as conn:
+                conn.send({'cmd': 'subscribe', 'enclosure': self.enclosure,
+                           'interval': interval})
+                while True:
+                    yield conn.recv()
+        except (OSError, EOFError) as exc:
+            raise EngineUnavailable(f"engine at {self.address} unavailable: {exc}") from exc
+
+
+def engine_factory_from_env():
+    """
+    Return (factory, runs): `factory` maps an enclosure name to its engine,
+    `runs()` returns {name: run} of the enclosures the engine is running
+    (those it resumed from checkpoints included).  RemoteEngines on the
+    socket in MOONLIGHT_ENGINE_SOCKET if set, else LocalEngines of this
+    process; `runs()` raises EngineUnavailable while the engine is down.
+    """
+    address = os.environ.get(ENGINE_SOCKET_ENV)
+    if not address:
+        host = EngineHost(os.environ.get(CHECKPOINT_DIR_ENV))
+        host.resume_all()
+        return host.get, host.runs
+    authkey = os.environ.get(ENGINE_AUTHKEY_ENV, "").encode()
+    return (lambda name: RemoteEngine(address, authkey, name),
+            lambda: RemoteEngine(address, authkey)._call('runs')['runs'])
+
+
+def _set_realtime_priority():
+    """Best effort: put the engine ahead of everything else on the Pi."""
+    try:
+        param = os.sched_param(os.sched_get_priority_min(os.SCHED_FIFO))
+        os.sched_setscheduler(0, os.SCHED_FIFO, param)
+        print("[Engine] running with SCHED_FIFO priority")
+    except (AttributeError, PermissionError, OSError):
+        try:
+            os.nice(-5)
+        except OSError:
+            pass
+
+
+def run_engine(address, authkey, realtime=False, checkpoint_dir=None):
+    """Body of the engine process: serve an EngineHost until SIGTERM/SIGINT."""
+    if realtime:
+        _set_realtime_priority()
+
+    host = EngineHost(checkpoint_dir or os.environ.get(CHECKPOINT_DIR_ENV))
+    # before serving, so a rebooted tank is back on its cycle right away
+    host.resume_all()
+
+    def _shutdown(signum, frame):
+        # park the arms and feeders before the process goes away
+        host.stop_all(timeout=30)
+        sys.exit(0)  # unwinds serve_engine, whose Listener removes the socket
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+    print(f"[Engine] pid {os.getpid()} serving on {address}")
+    serve_engine(host, address, authkey)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Moonlight simulation engine.")
+    parser.add_argument("--socket", required=True, help="Unix socket path to listen on")
+    parser.add_argument("--realtime", action="store_true",
+                        help="request SCHED_FIFO scheduling (needs root/CAP_SYS_NICE)")
+    parser.add_argument("--checkpoint-dir",
+                        help=f"save/resume running cycles here (default ${CHECKPOINT_DIR_ENV})")
+    args = parser.parse_args()
+
+    authkey = os.environ.get(ENGINE_AUTHKEY_ENV)
+    if not authkey:
+        parser.error(f"{ENGINE_AUTHKEY_ENV} must be set")
+    run_engine(args.socket, authkey.encode(), args.realtime, args.checkpoint_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Event log for simulation_loop, replacing its per-tick print().
+
+The loop logs state changes (phase, moonrise/moonset, sunrise/sunset,
+feeding, arm moves) rather than one line per tick, so log volume follows what
+the tank does instead of the tick rate.  Every category can also be rate
+limited: events over the limit are counted and the next one that gets
+through reports how many were dropped.
+
+Accepted events go to three places:
+  - a fixed-size ring buffer of recent events (EventLog.recent(), served by
+    the engine's 'events' command and GET /events),
+  - stdout, one line each, unless echo is off,
+  - optionally a BinarySink: compact length-prefixed records, cheap to write
+    to an SD card and readable with read_binary() / `python eventlog.py FILE`.
+"""
+import collections
+import datetime
+import struct
+import sys
+import threading
+import time
+
+RING_SIZE = 512
+
+# Categories used by simulation_loop.  Limits are (events per second, burst);
+# None means unlimited.  Only the periodic status line needs a limit, the
+# rest are state changes.
+DEFAULT_RATE_LIMITS = {
+    "status": (0.2, 1),     # one "where is the moon" line per 5 s
+    "phase":  None,
+    "moon":   None,
+    "sun":    None,
+    "feed":   None,
+    "arm":    None,
+    "sim":    None,
+}
+
+LogEvent = collections.namedtuple(
+    "LogEvent", "wall_time sim_time category message suppressed")
+
+
+class _TokenBucket:
+    def __init__(self, rate, burst, clock):
+        self.rate   = rate
+        self.burst  = burst
+        self.tokens = burst
+        self.last   = clock()
+        self._clock = clock
+
+    def take(self):
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+        self.last   = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class EventLog:
+    def __init__(self, capacity=RING_SIZE, rate_limits=None, sink=None,
+                 echo=True, clock=time.monotonic, sim_epoch=None):
+        """
+        With sim_epoch (a datetime), log() also takes sim times as integer
+        microseconds since it, the way CycleStepper keeps time.
+        """
+        self.events      = collections.deque(maxlen=capacity)
+        self.sink        = sink
+        self.echo        = echo
+        self.rate_limits = dict(DEFAULT_RATE_LIMITS, **(rate_limits or {}))
+        self.sim_epoch   = sim_epoch
+        self._clock      = clock
+        self._buckets    = {}
+        self._suppressed = collections.Counter()
+        self._lock       = threading.Lock()
+
+    def _allow(self, category):
+        limit = self.rate_limits.get(category)
+        if limit is None:
+            return True
+        bucket = self._buckets.get(category)
+        if bucket is None:
+            bucket = self._buckets[category] = _TokenBucket(*limit, self._clock)
+        return bucket.take()
+
+    def log(self, category, message, sim_time=None, *args):
+        """
+        Record an event; returns False if the category's limit dropped it.
+        `message % args` and an integer sim_time are only turned into text
+        and a datetime for events that get through, so a per-tick line that
+        is dropped costs next to nothing.
+        """
+        with self._lock:
+            if not self._allow(category):
+                self._suppressed[category] += 1
+                return False
+            suppressed = self._suppressed.pop(category, 0)
+            if args:
+                message = message % args
+            if isinstance(sim_time, int):
+                sim_time = self.sim_epoch + datetime.timedelta(microseconds=sim_time)
+            event = LogEvent(time.time(), sim_time, category, message, suppressed)
+            self.events.append(event)
+            if self.sink is not None:
+                self.sink.write(event)
+        if self.echo:
+            print(format_event(event))
+        return True
+
+    def recent(self, n=None, category=None):
+        """The last `n` events (all kept if None) as JSON-ready dicts."""
+        with self._lock:
+            events = list(self.events)
+        if category is not None:
+            events = [e for e in events if e.category == category]
+        if n is not None:
+            events = events[-n:]
+        return [{
+            "wall_time":  e.wall_time,
+            "sim_time":   e.sim_time.isoformat() if e.sim_time else None,
+            "category":   e.category,
+            "message":    e.message,
+            "suppressed": e.suppressed,
+        } for e in events]
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.close()
+
+
+def format_event(event):
+    sim = f"[Sim {event.sim_time:%Y-%m-%d %H:%M}] " if event.sim_time else ""
+    dropped = f" (+{event.suppressed} suppressed)" if event.suppressed else ""
+    return f"{sim}{event.category}: {event.message}{dropped}"
+
+
+# ---- binary sink -----------------------------------------------------------
+# File: MAGIC, then per event a RECORD header followed by the category and
+# message as UTF-8.  Sim time is seconds since the epoch (naive, as the loop
+# uses them), NaN when the event has none.
+MAGIC  = b"MLEV1\n"
+RECORD = struct.Struct("<ddIBH")   # wall, sim, suppressed, len(cat), len(msg)
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class BinarySink:
+    def __init__(self, path):
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+
+    def write(self, event):
+        cat = event.category.encode("utf-8")[:255]
+        msg = event.message.encode("utf-8")[:65535]
+        sim = ((event.sim_time - _EPOCH).total_seconds()
+               if event.sim_time else float("nan"))
+        self._file.write(RECORD.pack(event.wall_time, sim, event.suppressed,
+                                     len(cat), len(msg)) + cat + msg)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+def read_binary(path):
+    """Yield the LogEvents stored in a BinarySink file."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an event log")
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            wall, sim, suppressed, cat_len, msg_len = RECORD.unpack(header)
+            cat = f.read(cat_len).decode("utf-8")
+            msg = f.read(msg_len).decode("utf-8")
+            sim_time = None if sim != sim else _EPOCH + datetime.timedelta(seconds=sim)
+            yield LogEvent(wall, sim_time, cat, msg, suppressed)
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        for event in read_binary(path):
+            print(format_event(event))
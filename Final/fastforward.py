@@ -0,0 +1,176 @@
+"""
+Headless fast-forward: run a whole lunar cycle through simulation_loop at CPU
+speed against recording mock hardware and dump what it would have done.
+
+    python fastforward.py [--cycle-length 28] [--start-phase "Full Moon"]
+                          [--start-time 18:00] [--step-minutes 1]
+                          [--trace trace.csv]
+
+No Pi drivers are needed.  Every PWM duty change and OLED frame is recorded
+with the sim time it happened at, so schedule changes can be checked on a dev
+box in about a second instead of waiting out a real run.
+"""
+import argparse
+import csv
+import threading
+import time
+from collections import Counter
+
+from simulator import (
+    simulation_loop,
+    get_schedule,
+    compute_cycle_start_date,
+    ServoChannel,
+    ARM_DUTY_SPAN,
+    FEEDER_DUTY_SPAN,
+    FEEDER_HOME_ANGLE,
+    DEFAULT_HARDWARE,
+    DEFAULT_LUNAR_CYCLE_LENGTH,
+    LUNAR_PHASES,
+)
+
+
+class CommandTrace:
+    """Actuator/display commands in order, stamped with the current sim time."""
+
+    def __init__(self):
+        self.now    = None
+        self.events = []    # (sim_time, device, command, value)
+
+    def record(self, device, command, value):
+        self.events.append((self.now, device, command, value))
+
+    def set_time(self, sim_time):
+        self.now = sim_time
+
+
+class MockPWM:
+    """Stands in for rpi_hardware_pwm.HardwarePWM and records duty changes."""
+
+    def __init__(self, trace, pwm_channel, hz):
+        self.trace  = trace
+        self.device = f"pwm{pwm_channel}"
+        self.hz     = hz
+
+    def start(self, duty_cycle):
+        self.trace.record(self.device, "start", duty_cycle)
+
+    def change_duty_cycle(self, duty_cycle):
+        self.trace.record(self.device, "duty", round(duty_cycle, 3))
+
+    def stop(self):
+        self.trace.record(self.device, "stop", None)
+
+
+class MockDisplay:
+    """Stands in for the 1.27in RGB OLED and records the colour of each frame."""
+
+    width  = 128
+    height = 96
+
+    def __init__(self, trace):
+        self.trace = trace
+
+    def Init(self):
+        self.trace.record("oled", "init", None)
+
+    def clear(self):
+        self.trace.record("oled", "clear", None)
+
+    def getbuffer(self, image):
+        return image
+
+    def ShowImage(self, image):
+        self.trace.record("oled", "show", "#%02X%02X%02X" % image.getpixel((0, 0)))
+
+
+def _no_sleep(seconds):
+    pass
+
+
+def run_fast_forward(cycle_length=DEFAULT_LUNAR_CYCLE_LENGTH,
+                     start_phase='Full Moon',
+                     cycle_start_date=None,
+                     step_minutes=1,
+                     hex_color='FF0000',
+                     feed_start_time='19:00',
+                     feed_end_time='04:00'):
+    """Run one full cycle without sleeping and return its CommandTrace."""
+    if cycle_start_date is None:
+        cycle_start_date = compute_cycle_start_date('18:00')
+
+    trace = CommandTrace()
+
+    def pwm_factory(pwm_channel, hz):
+        return MockPWM(trace, pwm_channel, hz)
+
+    arm    = ServoChannel(DEFAULT_HARDWARE['arm_channel'], ARM_DUTY_SPAN, 0,
+                          pwm_factory=pwm_factory, sleep=_no_sleep)
+    feeder = ServoChannel(DEFAULT_HARDWARE['feeder_channel'], FEEDER_DUTY_SPAN,
+                          FEEDER_HOME_ANGLE, pwm_factory=pwm_factory, sleep=_no_sleep)
+
+    simulation_loop(
+        get_schedule(cycle_length, start_phase),
+        cycle_start_date,
+        cycle_length,
+        step_minutes,
+        1.0,        # speed_factor, unused without sleeps
+        86400,      # day_length_in_real_seconds, unused without sleeps
+        hex_color,
+        feed_start_time,
+        feed_end_time,
+        False,      # independent_timer
+        None,
+        None,
+        threading.Event(),
+        arm=arm,
+        feeder=feeder,
+        display=MockDisplay(trace),
+        fast_forward=True,
+        on_tick=trace.set_time,
+    )
+    return trace
+
+
+def write_trace_csv(trace, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["sim_time", "device", "command", "value"])
+        for sim_time, device, command, value in trace.events:
+            writer.writerow([sim_time.isoformat() if sim_time else "",
+                             device, command, value])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a lunar cycle at CPU speed.")
+    parser.add_argument("--cycle-length", type=int, default=DEFAULT_LUNAR_CYCLE_LENGTH)
+    parser.add_argument("--start-phase", default="Full Moon", choices=LUNAR_PHASES)
+    parser.add_argument("--start-time", default="18:00", help="HH:MM of the first tick")
+    parser.add_argument("--step-minutes", type=float, default=1.0,
+                        help="sim minutes per tick")
+    parser.add_argument("--hex-color", default="FF0000")
+    parser.add_argument("--feed-start", default="19:00")
+    parser.add_argument("--feed-end", default="04:00")
+    parser.add_argument("--trace", help="write the command trace to this CSV file")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    trace = run_fast_forward(args.cycle_length, args.start_phase,
+                             compute_cycle_start_date(args.start_time),
+                             args.step_minutes, args.hex_color,
+                             args.feed_start, args.feed_end)
+    elapsed = time.perf_counter() - t0
+
+    counts = Counter((device, command) for _, device, command, _ in trace.events)
+    print(f"{args.cycle_length}-day cycle simulated in {elapsed:.2f} s, "
+          f"{len(trace.events)} commands")
+    for (device, command), n in sorted(counts.items()):
+        print(f"  {device:6} {command:6} {n}")
+
+    if args.trace:
+        write_trace_csv(trace, args.trace)
+        print(f"Trace written to {args.trace}")
+
+
+if __name__ == "__main__":
+    main()
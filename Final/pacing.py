@@ -0,0 +1,132 @@
+"""
+Drift-free pacing for simulation_loop.
+
+Tick k of a run is due at wall time t0 + k * tick_real_s (on time.monotonic)
+and represents sim time sim_start + k * tick_sim, so the sim clock is a pure
+function of elapsed wall time, like oled3.py's elapsed-real-time mapping.
+Time spent inside a tick no longer accumulates: sleeps go to the next
+absolute deadline, and a loop that has fallen behind jumps to the tick that
+is due now instead of replaying the ones it missed.
+
+With adaptive stepping the clock also resizes its ticks: while a tick's body
+takes more than half its period the tick is doubled (twice the sim step over
+twice the wall period, so the speed is unchanged), and it is halved again
+once the body fits in an eighth.  Callers must treat each tick as covering
+the whole interval since the previous one (see simulator.daily_crossings).
+"""
+import math
+import time
+
+
+# Body-time/period ratios that make an adaptive clock grow or shrink its tick.
+GROW_RATIO   = 0.5
+SHRINK_RATIO = 0.125
+# Smoothing of the body-time average, so one slow tick doesn't resize.
+BODY_EWMA    = 0.1
+
+
+class PacingClock:
+    def __init__(self, sim_start, tick_sim, tick_real_s,
+                 clock=time.monotonic, sleep=time.sleep, max_tick_sim=None):
+        """
+        sim_start    sim time of tick 0
+        tick_sim     sim time per tick
+        tick_real_s  wall seconds per tick
+        max_tick_sim largest tick_sim adapt() may grow a tick to; None
+                     disables adaptive stepping
+
+        Sim times are datetime/timedelta or plain integers (simulation_loop
+        uses microseconds since the cycle start); ticks only ever double and
+        halve, so integer ticks stay integers.
+        """
+        self.sim_start    = sim_start
+        self.tick_sim     = tick_sim
+        self.tick_real_s  = tick_real_s
+        self.base_tick    = tick_sim
+        self.max_tick_sim = max_tick_sim
+        self._clock       = clock
+        self._sleep       = sleep
+        self.t0           = clock()
+        self.tick         = 0
+        self.skipped      = 0     # ticks coalesced away over the whole run
+        self._body_avg    = None
+
+    @property
+    def sim_time(self):
+        return self.sim_start + self.tick * self.tick_sim
+
+    def deadline(self, tick=None):
+        """Monotonic time at which `tick` (default: the current one) is due."""
+        return self.t0 + (self.tick if tick is None else tick) * self.tick_real_s
+
+    def lateness(self):
+        """Wall seconds the current tick started after its deadline."""
+        return self._clock() - self.deadline()
+
+    def wait_next(self):
+        """
+        Sleep until the next tick is due and advance to it.  If the deadline
+        has already passed, skip straight to the latest due tick.  Returns
+        (sim_time, skipped) where skipped counts ticks coalesced this call.
+        """
+        sim_time, skipped, wait_s = self.advance()
+        if wait_s > 0:
+            self._sleep(wait_s)
+        return sim_time, skipped
+
+    def advance(self):
+        """
+        wait_next() without the sleep, for callers that wait their own way
+        (the asyncio runtime awaits it): returns (sim_time, skipped, wait_s)
+        where wait_s is how long until the new tick is due.
+        """
+        target = self.tick + 1
+        now = self._clock()
+        due = int(math.floor((now - self.t0) / self.tick_real_s))
+        skipped, wait_s = 0, 0.0
+        if due >= target:
+            skipped = due - target
+            target  = due
+        else:
+            wait_s = max(0.0, self.deadline(target) - now)
+        self.tick     = target
+        self.skipped += skipped
+        return self.sim_time, skipped, wait_s
+
+    def adapt(self, body_s):
+        """Resize the tick from the smoothed body time; True if it changed."""
+        if self.max_tick_sim is None:
+            return False
+        if self._body_avg is None:
+            self._body_avg = body_s
+        else:
+            self._body_avg += BODY_EWMA * (body_s - self._body_avg)
+
+        if (self._body_avg > GROW_RATIO * self.tick_real_s
+                and self.tick_sim * 2 <= self.max_tick_sim):
+            self._rescale(2)
+        elif (self._body_avg < SHRINK_RATIO * self.tick_real_s
+                and self.tick_sim > self.base_tick):
+            self._rescale(-2)
+        else:
+            return False
+        return True
+
+    def _rescale(self, factor):
+        # factor 2 doubles the tick, -2 halves it; restart the tick grid at
+        # the current tick so the mapping stays continuous
+        self.sim_start = self.sim_time
+        self.t0        = self.deadline()
+        self.tick      = 0
+        if factor > 0:
+            self.tick_sim    *= factor
+            self.tick_real_s *= factor
+        else:
+            self.tick_sim    //= -factor
+            self.tick_real_s /= -factor
+
+    def rebase(self, sim_time):
+        """Make `sim_time` the current tick's time, due now (used for seeks)."""
+        self.sim_start = sim_time
+        self.t0        = self._clock()
+        self.tick      = 0
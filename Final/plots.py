@@ -0,0 +1,220 @@
+"""
+Schedule plots drawn on explicit Figure objects.
+
+The web UI used to draw through pyplot: every request made a new figure via
+the global current-figure state, saved it with plt.savefig and closed it.
+pyplot's state is shared by all threads, so two plot requests served at once
+by Flask's threaded server could draw into each other's figure, and every
+request paid again for the figure, axes, ticks and fonts.
+
+Here each kind of plot owns one persistent Figure with a FigureCanvasAgg
+(no pyplot, no GUI backend) and a lock.  The axes, lines and images are
+created once by the plot's `setup`; a render only swaps their data in place
+(`update`) and prints the canvas.  Requests for the same plot take turns on
+its lock, different plots render concurrently.
+
+The CLI's plot_* functions in simulator.py use the same setup/update pairs
+on pyplot figures, so both draw the same pictures.
+"""
+import threading
+
+import numpy as np
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import simulator
+
+
+def _hours(t):
+    return t.hour + t.minute / 60.0 if t else np.nan
+
+
+# ---- phase angle -----------------------------------------------------------
+def setup_phase_angle(fig):
+    ax = fig.add_subplot()
+    line, = ax.plot([], [], marker='o')
+    ax.set_xlabel("Day in Lunar Cycle")
+    ax.set_ylabel("Phase Angle (°)")
+    ax.set_ylim(0, 190.05)
+    ax.grid(True, alpha=0.3)
+    return ax, line
+
+def update_phase_angle(fig, artists, schedule):
+    ax, line = artists
+    days = [entry['day'] for entry in schedule]
+    line.set_data(days, [entry['phase_angle'] for entry in schedule])
+    ax.set_title(f"Moon Phase Angle Over Lunar Cycle (start: {schedule[0]['phase']})")
+    ax.set_xticks(days)
+    ax.relim()
+    ax.autoscale_view(scaley=False)
+
+
+# ---- moonrise / moonset ----------------------------------------------------
+def setup_rise_set(fig):
+    ax = fig.add_subplot()
+    rise, = ax.plot([], [], marker='o', label='Moonrise')
+    set_, = ax.plot([], [], marker='o', label='Moonset')
+    ax.set_title('Moonrise and Moonset Times')
+    ax.set_xlabel('Day in Lunar Cycle')
+    ax.set_ylabel('Time of Day (Hours)')
+    ax.set_yticks(range(0, 28, 2))
+    ax.set_ylim(0, 28)
+    ax.grid(True)
+    ax.legend()
+    return ax, rise, set_
+
+def update_rise_set(fig, artists, schedule):
+    ax, rise, set_ = artists
+    days = [entry['day'] - 1 for entry in schedule]
+    rise.set_data(days, [_hours(entry['moonrise_time']) for entry in schedule])
+    set_.set_data(days, [_hours(entry['moonset_time'])  for entry in schedule])
+    ax.set_xticks(range(1, len(schedule) + 1))
+    ax.relim()
+    ax.autoscale_view(scaley=False)
+
+
+# ---- phase by day ----------------------------------------------------------
+def setup_phases(fig):
+    ax = fig.add_subplot()
+    points, = ax.plot([], [], marker='o', linestyle='none')
+    ax.set_xlabel("Day in Lunar Cycle")
+    ax.set_ylabel("Lunar Phase")
+    ax.set_title("Lunar Phase by Day")
+    ax.grid(True, alpha=0.3)
+    return ax, points
+
+def update_phases(fig, artists, schedule):
+    ax, points = artists
+    rotated = simulator.rotate_phases(schedule[0]['phase'])
+    points.set_data([entry['day'] for entry in schedule],
+                    [rotated.index(entry['phase']) for entry in schedule])
+    ax.set_yticks(range(len(rotated)), rotated)
+    ax.relim()
+    ax.autoscale_view()
+
+
+# ---- altitude over one night -----------------------------------------------
+def setup_altitude(fig):
+    ax = fig.add_subplot()
+    curve,   = ax.plot([], [], color='purple')
+    markers, = ax.plot([], [], marker='o', markersize=4.5, linestyle='none', color='red')
+    ax.set_xlabel("Time")
+    ax.set_ylabel("Altitude (degrees)")
+    ax.xaxis.set_major_locator(mdates.HourLocator())
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
+    for label in ax.get_xticklabels(which='major'):
+        label.set(rotation=30, horizontalalignment='right')
+    fig.subplots_adjust(bottom=0.2)
+    ax.set_ylim(0, 200)
+    ax.grid(True, alpha=0.3)
+    return ax, curve, markers
+
+def update_altitude(fig, artists, schedule_entry, cycle_start_date, marker_interval=60):
+    ax, curve, markers = artists
+    title = f"Hourly Altitude (Day {schedule_entry['day']} - {schedule_entry['phase']})"
+    if not schedule_entry['moonrise_time'] or not schedule_entry['moonset_time']:
+        curve.set_data([], [])
+        markers.set_data([], [])
+        ax.set_title(title + ": no moon visibility")
+        return
+    moonrise_dt, moonset_dt = simulator._rise_set(schedule_entry, cycle_start_date)
+
+    # per-minute curve, markers every marker_interval minutes
+    time_points = np.arange(np.datetime64(moonrise_dt, 'm'),
+                            np.datetime64(moonset_dt, 'm') + 1, np.timedelta64(1, 'm'))
+    altitudes   = simulator.altitude_array(schedule_entry, time_points, cycle_start_date)
+    x           = mdates.date2num(time_points)
+    every       = slice(None, None, max(1, int(marker_interval)))
+    curve.set_data(x, altitudes)
+    markers.set_data(x[every], altitudes[every])
+    ax.set_title(title)
+    ax.set_xlim(x[0], x[-1])
+
+
+# ---- whole cycle heatmap ---------------------------------------------------
+def setup_cycle_heatmap(fig):
+    ax_alt, ax_light = fig.subplots(1, 2, sharey=True)
+    images = []
+    for ax, title, cmap, vmax in ((ax_alt, "Moon Altitude (°)", 'viridis', 180),
+                                  (ax_light, "Brightness", 'magma', 1)):
+        image = ax.imshow(np.ma.masked_all((1, 1)), aspect='auto', cmap=cmap,
+                          vmin=0, vmax=vmax, interpolation='nearest')
+        ax.set_facecolor('lightgrey')
+        ax.set_title(title)
+        ax.set_xticks(range(0, 25, 3))
+        ax.set_xticklabels([f"{(simulator.SUNRISE_HOUR + h) % 24:02d}:00"
+                            for h in range(0, 25, 3)])
+        ax.set_xlabel("Time of Day")
+        fig.colorbar(image, ax=ax)
+        images.append(image)
+    ax_alt.set_ylabel("Day in Lunar Cycle")
+    return ax_alt, images
+
+def update_cycle_heatmap(fig, artists, schedule, cycle_start_date, step_minutes=5):
+    ax_alt, (alt_image, light_image) = artists
+    moon_alt, brightness = cycle_heatmap_data(schedule, cycle_start_date, step_minutes)
+    days   = len(schedule)
+    extent = [0, 24, days + 0.5, 0.5]
+    for image, data in ((alt_image, moon_alt), (light_image, brightness)):
+        image.set_data(np.ma.masked_invalid(data))
+        image.set_extent(extent)
+    fig.set_size_inches(14, max(4, days * 0.2 + 2))
+    fig.suptitle(f"Whole Cycle ({days} days, start: {schedule[0]['phase']})")
+
+def cycle_heatmap_data(schedule, cycle_start_date, step_minutes=5):
+    """
+    (moon_alt, brightness) grids of the cycle, days x time of day from
+    sunrise: moon altitude with daytime masked (the arm follows the sun
+    then), and brightness 1 by day, phase_angle/180 while the moon is up,
+    0 otherwise.  NaN before the cycle starts.
+    """
+    times, alt = simulator.cycle_altitudes(schedule, cycle_start_date, step_minutes)
+    hours  = (simulator.SUNRISE_HOUR + np.arange(times.shape[1]) * step_minutes / 60.0) % 24
+    is_day = (hours >= simulator.SUNRISE_HOUR) & (hours < simulator.SUNSET_HOUR)
+    phase  = np.array([entry['phase_angle'] for entry in schedule])[:, np.newaxis]
+    before = np.isnan(alt)
+    moon_alt   = np.where(is_day | before, np.nan, np.clip(alt, 0, None))
+    brightness = np.where(is_day, 1.0, np.where(alt > 0, phase / 180.0, 0.0))
+    brightness[before] = np.nan
+    return moon_alt, brightness
+
+
+# (figsize, setup, update) per plot
+PLOTS = {
+    "phase_angle":   ((8, 4),  setup_phase_angle,   update_phase_angle),
+    "rise_set":      ((10, 7), setup_rise_set,      update_rise_set),
+    "phases":        ((10, 4), setup_phases,        update_phases),
+    "altitude":      ((10, 5), setup_altitude,      update_altitude),
+    "cycle_heatmap": ((14, 8), setup_cycle_heatmap, update_cycle_heatmap),
+}
+
+
+class PlotCanvas:
+    """One persistent Agg figure for one kind of plot."""
+
+    def __init__(self, figsize, setup, update):
+        self.figure  = Figure(figsize=figsize)
+        FigureCanvasAgg(self.figure)
+        self.artists = setup(self.figure)
+        self._update = update
+        self._lock   = threading.Lock()
+
+    def render(self, path, *args, **kwargs):
+        """Redraw with new data and write the PNG to `path`."""
+        with self._lock:
+            self._update(self.figure, self.artists, *args, **kwargs)
+            self.figure.savefig(path)
+
+
+_canvases = {}
+_canvases_lock = threading.Lock()
+
+def render(kind, path, *args, **kwargs):
+    """Render plot `kind` (a PLOTS key) of `args` to the PNG file `path`."""
+    with _canvases_lock:
+        canvas = _canvases.get(kind)
+        if canvas is None:
+            canvas = _canvases[kind] = PlotCanvas(*PLOTS[kind])
+    canvas.render(path, *args, **kwargs)
+    return path
@@ -0,0 +1,138 @@
+"""
+Production entry point for the Moonlight controller.
+
+    python serve.py [--host 0.0.0.0] [--port 5000] [--threads 8] [--realtime]
+                    [--checkpoint-dir /var/lib/moonlight]
+
+`python app.py` runs Flask's single-process development server.  This script
+instead runs the controller as separate processes:
+
+  * the simulation engine (engine.py), which owns the display, servos and
+    feeder and serves a private Unix socket (protocol in engine.py);
+  * the HTTP tier, running app.py under waitress (a threaded production WSGI
+    server) at lower CPU priority, which reaches the engine only through
+    that socket.
+
+This process only supervises: if the engine dies it is restarted on the same
+socket without touching the HTTP process, and vice versa.  With
+--engine-socket pointing at an engine started elsewhere (e.g. its own
+systemd unit) and --external-engine, only the HTTP tier is launched.
+
+If waitress is not installed the HTTP tier falls back to werkzeug's threaded
+server with the reloader and debugger disabled.
+"""
+import argparse
+import multiprocessing
+import os
+import secrets
+import signal
+import tempfile
+import time
+
+from engine import run_engine, ENGINE_SOCKET_ENV, ENGINE_AUTHKEY_ENV
+from checkpoint import CHECKPOINT_DIR_ENV
+
+# HTTP work yields to the engine whenever both want the CPU.
+HTTP_NICENESS = 10
+# Seconds to wait before restarting a child that exited.
+RESTART_DELAY_S = 2.0
+
+
+def run_http(host, port, threads, engine_address, authkey_hex):
+    """Child process: serve app.py against the engine socket."""
+    try:
+        os.nice(HTTP_NICENESS)
+    except OSError:
+        pass
+    os.environ[ENGINE_SOCKET_ENV]  = engine_address
+    os.environ[ENGINE_AUTHKEY_ENV] = authkey_hex
+    from app import app  # imported after the env is set so it picks RemoteEngine
+
+    try:
+        from waitress import serve
+    except ImportError:
+        print("[HTTP] waitress not installed, using werkzeug threaded server")
+        from werkzeug.serving import run_simple
+        run_simple(host, port, app, threaded=True,
+                   use_reloader=False, use_debugger=False)
+    else:
+        print(f"[HTTP] waitress on {host}:{port} with {threads} threads")
+        serve(app, host=host, port=port, threads=threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Moonlight controller.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=8,
+                        help="HTTP worker threads")
+    parser.add_argument("--engine-socket",
+                        default=os.path.join(tempfile.gettempdir(), "moonlight-engine.sock"))
+    parser.add_argument("--external-engine", action="store_true",
+                        help=f"don't launch an engine; connect to --engine-socket "
+                             f"using the key in ${ENGINE_AUTHKEY_ENV}")
+    parser.add_argument("--checkpoint-dir", default=os.environ.get(CHECKPOINT_DIR_ENV),
+                        help="save running cycles here and resume them after a reboot")
+    parser.add_argument("--realtime", action="store_true",
+                        help="run the engine with SCHED_FIFO priority")
+    args = parser.parse_args()
+
+    if args.external_engine:
+        authkey_hex = os.environ.get(ENGINE_AUTHKEY_ENV)
+        if not authkey_hex:
+            parser.error(f"--external-engine needs {ENGINE_AUTHKEY_ENV}")
+    else:
+        authkey_hex = secrets.token_hex(16)
+
+    # spawn, not fork: children start from a clean interpreter
+    ctx = multiprocessing.get_context("spawn")
+
+    def start_engine():
+        proc = ctx.Process(target=run_engine,
+                           args=(args.engine_socket, authkey_hex.encode(), args.realtime,
+                                 args.checkpoint_dir),
+                           name="moonlight-engine")
+        proc.start()
+        return proc
+
+    def start_http():
+        proc = ctx.Process(target=run_http,
+                           args=(args.host, args.port, args.threads,
+                                 args.engine_socket, authkey_hex),
+                           name="moonlight-http")
+        proc.start()
+        return proc
+
+    children = {"http": start_http}
+    if not args.external_engine:
+        children["engine"] = start_engine
+    procs = {name: start() for name, start in children.items()}
+    print("[Supervisor] " + ", ".join(f"{n} pid {p.pid}" for n, p in procs.items()))
+
+    stopping = False
+
+    def _stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    while not stopping:
+        for name, proc in procs.items():
+            if not proc.is_alive():
+                print(f"[Supervisor] {name} exited with {proc.exitcode}, restarting")
+                time.sleep(RESTART_DELAY_S)
+                procs[name] = children[name]()
+        time.sleep(0.5)
+
+    # HTTP first so no new commands arrive, then let the engine park hardware
+    for name in ("http", "engine"):
+        proc = procs.get(name)
+        if proc is not None and proc.is_alive():
+            proc.terminate()
+            proc.join(timeout=35)
+
+
+if __name__ == "__main__":
+    main()
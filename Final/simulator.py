@@ -8,19 +8,40 @@ import time
 import math
 import datetime
 import threading
+import functools
+import json
+from collections import namedtuple
 from queue import Queue
-import numpy as np
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from waveshare_OLED import OLED_1in27_rgb
-from PIL import Image, ImageDraw, ImageFont
-from rpi_hardware_pwm import HardwarePWM
-
-current_servo_angle = 0
-# want the feeder to start at 25 degrees
-current_feeder_angle = 25
+from PIL import Image
+from tickstats import TickStats
+from eventlog import EventLog, BinarySink
+from pacing import PacingClock
+from motion import duty_table, trapezoid, writes, PROFILE_DT, DEFAULT_ACCEL
+from alarms import AlarmService
+
+# matplotlib and the Pi drivers are slow to import and not needed to reach the
+# first servo/OLED update, so they are loaded on first use.  Without the
+# drivers the simulator still runs against mock backends (see fastforward.py).
+@functools.lru_cache(maxsize=None)
+def _pyplot():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+def _oled_driver():
+    try:
+        from waveshare_OLED import OLED_1in27_rgb
+    except ImportError:
+        return None
+    return OLED_1in27_rgb
+
+def _hardware_pwm():
+    try:
+        from rpi_hardware_pwm import HardwarePWM
+    except ImportError:
+        return None
+    return HardwarePWM
 
 SUNSET_HOUR  = 18
 SUNRISE_HOUR = 6
@@ -61,146 +82,220 @@ MoonPhaseChecker = {
 
 DEFAULT_LATER_PER_DAY = (50 * 28) / 29
 
+# Status published by simulation_loop for other threads (e.g. Flask /status).
+# Each snapshot is immutable and replaced wholesale, so a reader holding one
+# always sees fields that came from the same tick.
+SimSnapshot = namedtuple('SimSnapshot', [
+    'sim_time',       # datetime of the tick
+    'elapsed_s',      # sim seconds since the run's cycle start
+    'progress',       # percent of the cycle completed
+    'phase',
+    'phase_angle',
+    'altitude',
+    'is_day',
+])
+
+# Minimum real seconds between snapshot publications (phase changes are
+# always published immediately).
+SNAPSHOT_INTERVAL_S = 0.25
+
+# If set, simulation_loop writes its tick timing summary here as JSON on exit.
+TICK_STATS_PATH = os.environ.get("MOONLIGHT_TICK_STATS")
+# If set, simulation_loop also appends its events to this binary log file.
+EVENT_LOG_PATH  = os.environ.get("MOONLIGHT_EVENT_LOG")
+
+# Largest sim step the adaptive clock may grow a tick to when the loop can't
+# keep up with the requested speed (feeding/sunrise/sunset still fire once).
+MAX_SIM_STEP = datetime.timedelta(minutes=5)
+
+class ServoChannel:
+    """A hobby servo on one hardware PWM channel, remembering its last angle."""
+
+    def __init__(self, pwm_channel, duty_span, angle, duty_min=2.6, hz=50,
+                 pwm_factory=None, sleep=time.sleep, clock=time.monotonic,
+                 accel=DEFAULT_ACCEL):
+        self.pwm_channel = pwm_channel
+        self.duty_min    = duty_min
+        self.duty_span   = duty_span
+        self.hz          = hz
+        self.angle       = angle
+        self.accel       = accel          # deg/s^2 of move() profiles
+        self.pwm_factory = pwm_factory    # None -> rpi_hardware_pwm.HardwarePWM
+        self.sleep       = sleep
+        self.clock       = clock
+        self.table       = duty_table(duty_min, duty_span)
+        self._pwm        = None
+        self._duty       = None
+
+    def set_angle(self, angle):
+        if self._pwm is None:
+            factory = self.pwm_factory or _hardware_pwm()
+            if factory is None:
+                raise RuntimeError("rpi_hardware_pwm is not installed")
+            self._pwm = factory(pwm_channel=self.pwm_channel, hz=self.hz)
+            self._pwm.start(0)
+        duty_cycle = self.table.duty(angle)
+        if duty_cycle != self._duty:
+            self._pwm.change_duty_cycle(duty_cycle)
+            self._duty = duty_cycle
+        self.angle = angle
+        return duty_cycle
+
+    def move(self, start_angle, end_angle, delay=0.05, step=1):
+        """
+        Sweep from start_angle to end_angle with a trapezoidal profile whose
+        cruise speed is the old step-per-delay rate (step degrees every
+        `delay` seconds), see motion.py.
+        """
+        self.set_angle(start_angle)
+        if delay <= 0:
+            self.set_angle(end_angle)
+            return
+        t0 = self.clock()
+        profile = trapezoid(start_angle, end_angle, abs(step) / delay, self.accel)
+        for k, angle in writes(profile, start_angle):
+            wait = t0 + k * PROFILE_DT - self.clock()
+            if wait > 0:
+                self.sleep(wait)
+            self.set_angle(angle)
+
+
+ARM_DUTY_SPAN    = 6.5
+FEEDER_DUTY_SPAN = 10.5
+# want the feeder to start at 25 degrees
+FEEDER_HOME_ANGLE = 25
+
+_servos = {}
+
+def servo_for(pwm_channel, duty_span, home_angle):
+    """Return the shared ServoChannel for a PWM channel, creating it once."""
+    key = (pwm_channel, duty_span)
+    if key not in _servos:
+        _servos[key] = ServoChannel(pwm_channel, duty_span, home_angle)
+    return _servos[key]
+
+#pwm_channel = 1 = pin 13? double check in config.txt file
+ARM_SERVO    = servo_for(1, ARM_DUTY_SPAN, 0)
+FEEDER_SERVO = servo_for(0, FEEDER_DUTY_SPAN, FEEDER_HOME_ANGLE)
+
+# Which PWM channels and whether the OLED belong to one simulation.  Several
+# enclosures can run side by side as long as they don't share channels.
+DEFAULT_HARDWARE = {
+    'arm_channel':    1,
+    'feeder_channel': 0,
+    'display':        True,
+}
+
 def set_servo_angle(angle):
-    global current_servo_angle
-    pwm = HardwarePWM(pwm_channel=1, hz=50)
-    pwm.start(0)
-    duty_cycle = 2.6 + 6.5 * (angle / 180.0)
-    pwm.change_duty_cycle(duty_cycle)
-    current_servo_angle = angle
-
-    return duty_cycle
-
-def move_arm(start_angle, end_angle, delay= 0.05, step=1):
-    #start_angle = 180
-    #end_angle = 90
-    if start_angle < end_angle:
-        angle_range = range(int(start_angle), int(end_angle) + 1, int(step))
-    else:
-        angle_range = range(int(start_angle), int(end_angle) - 1, -int(step))
-    for angle in angle_range:
-        set_servo_angle(angle)
-        time.sleep(delay) 
-        # print(f"Moving arm to {angle}°")
-        #print(f"This is the delay: {delay}")
-
-def move_arm_zero(start_angle, end_angle, delay=0.05, step=1):
+    return ARM_SERVO.set_angle(angle)
+
+def move_arm(start_angle, end_angle, delay= 0.05, step=1, arm=ARM_SERVO):
+    arm.move(start_angle, end_angle, delay, step)
+
+def move_arm_zero(start_angle, end_angle, delay=0.05, step=1, arm=ARM_SERVO):
     """
     Move the arm from start_angle to end_angle one step at a time.
     No reliance on compare_alt; just a straight sweep.
     """
-    # pick the right direction
-    if start_angle < end_angle:
-        angle_range = range(int(start_angle), int(end_angle) + 1, int(step))
-    else:
-        angle_range = range(int(start_angle), int(end_angle) - 1, -int(step))
-
-    for angle in angle_range:
-        set_servo_angle(angle)
-        time.sleep(delay)
-        # print(f"Moving arm to {angle}°")
+    arm.move(start_angle, end_angle, delay, step)
 
 
 def set_feeder_angle(feeder_angle):
-    global current_feeder_angle
-    #pwm_channel = 1 = pin 13? double check in config.txt file
-    pwm = HardwarePWM(pwm_channel=0, hz=50)
-    pwm.start(0)
-    duty_cycle = 2.6 + 10.5 * (feeder_angle / 180.0)
-    pwm.change_duty_cycle(duty_cycle)
-    current_feeder_angle = feeder_angle
-
-    return duty_cycle
-
-def move_feeder(start_angle, end_angle, stop_event = None, delay=0.05, step=1):
-    if start_angle < end_angle:
-        angle_range = range(int(start_angle), int(end_angle) + 1, int(step))
-    else:
-        angle_range = range(int(start_angle), int(end_angle) - 1, -int(step))
-    
-    for angle in angle_range:
-        # if stop_event.is_set():
-        #     return
-        # else:
-            set_feeder_angle(angle)
-            '''thread this sleep bc it stops the entire sim'''
-            time.sleep(delay) 
-    
+    return FEEDER_SERVO.set_angle(feeder_angle)
+
+def move_feeder(start_angle, end_angle, stop_event = None, delay=0.05, step=1, feeder=FEEDER_SERVO):
+    '''thread this sleep bc it stops the entire sim'''
+    feeder.move(start_angle, end_angle, delay, step)
+
 
-def drop_feeder(): #primary
-    move_feeder(current_feeder_angle, 120, step=1, delay=0.05)
+def drop_feeder(feeder=FEEDER_SERVO): #primary
+    feeder.move(feeder.angle, 120, step=1, delay=0.05)
 
-def reset_feeder():
-    move_feeder(current_feeder_angle, 25, delay=0.05, step=1)
+def reset_feeder(feeder=FEEDER_SERVO):
+    feeder.move(feeder.angle, FEEDER_HOME_ANGLE, delay=0.05, step=1)
 
-def return_feeder():
-    move_feeder(120, 25, delay = 0.05, step =1)
+def return_feeder(feeder=FEEDER_SERVO):
+    feeder.move(120, FEEDER_HOME_ANGLE, delay = 0.05, step =1)
 
-def shake_feeder(): # primary
+def shake_feeder(feeder=FEEDER_SERVO): # primary
     # Shake the feeder by moving it back and forth
     for _ in range(1):
-        move_feeder(current_feeder_angle, 80, delay=0.05, step=5)
-        move_feeder(current_feeder_angle, 120, delay=0.05, step=5)
-    reset_feeder()
+        feeder.move(feeder.angle, 80, delay=0.05, step=5)
+        feeder.move(feeder.angle, 120, delay=0.05, step=5)
+    reset_feeder(feeder)
 
-def drop_alarm():
-    drop_feeder()
+def drop_alarm(feeder=FEEDER_SERVO):
+    drop_feeder(feeder)
     print(f"Feeder Dropped")
     #print(feeder_thread)
 
-def feeding_alarm():
+def feeding_alarm(feeder=FEEDER_SERVO):
     print(f"Feeder Reset")
     #shake_feeder()
-    move_feeder(current_feeder_angle, 25, delay=0.05, step=1)
+    feeder.move(feeder.angle, FEEDER_HOME_ANGLE, delay=0.05, step=1)
 
     #return_feeder()
-    
-
-def get_num_phases(target_cycle_length):
-    scalar = target_cycle_length / DEFAULT_LUNAR_CYCLE_LENGTH
-    scaled_phases = {}
 
-    for phase in LUNAR_PHASES:
-        base_length = MoonPhaseLengthDays[phase]
-        if scalar >= 1:
-            if MoonPhaseChecker[phase] == 'x':
-                new_length = math.floor(scalar * base_length)
-            else:
-                new_length = math.ceil(scalar * base_length)
-        else:
-            # scalar < 1
-            if MoonPhaseChecker[phase] == 'x':
-                new_length = math.ceil(scalar * base_length)
-            else:
-                new_length = math.floor(scalar * base_length)
-
-        scaled_phases[phase] = new_length
-
-    new_total = sum(scaled_phases.values())
-
-    # Adjust if sum doesn't match target
-    if new_total != target_cycle_length:
-        if new_total > target_cycle_length:
-            # Reduce days from 'o' phases
-            for phase in MoonPhaseChecker:
-                if MoonPhaseChecker[phase] == 'o' and scaled_phases[phase] > 0:
-                    scaled_phases[phase] -= 1
-                    new_total = sum(scaled_phases.values())
-                    if new_total == target_cycle_length:
-                        break
-        else:
-            # Add days to 'o' phases
-            for phase in MoonPhaseChecker:
-                if MoonPhaseChecker[phase] == 'o':
-                    scaled_phases[phase] += 1
-                    new_total = sum(scaled_phases.values())
-                    if new_total == target_cycle_length:
-                        break
-
-    return scaled_phases, new_total
+def set_feed_alarms(alarms, name, independent_timer, drop_countdown,
+                    end_feed_countdown, feeder=FEEDER_SERVO):
+    """
+    Arm the independent feeder timer `name` on an AlarmService: drop_alarm
+    at drop_countdown and feeding_alarm at end_feed_countdown, every day on
+    the wall clock.  With independent_timer off both alarms are cancelled.
+    """
+    if independent_timer:
+        alarms.set_daily(f"{name}:drop", drop_countdown,
+                         functools.partial(drop_alarm, feeder))
+        alarms.set_daily(f"{name}:end", end_feed_countdown,
+                         functools.partial(feeding_alarm, feeder))
+    else:
+        alarms.cancel(f"{name}:drop")
+        alarms.cancel(f"{name}:end")
+    
 
+# get_num_phases tables, in LUNAR_PHASES order
+_PHASE_DAYS = [MoonPhaseLengthDays[p] for p in LUNAR_PHASES]
+_PRINCIPAL  = [MoonPhaseChecker[p] == 'x' for p in LUNAR_PHASES]
+# leftover days on equal remainders: 'o' phases first, later phases first
+_TIE_ORDER  = sorted(range(len(LUNAR_PHASES)),
+                     key=lambda i: (_PRINCIPAL[i], -i))
 
-def calculate_moonrise_times(target_cycle_length, start_phase='Full Moon'):
+def get_num_phases(target_cycle_length):
+    """
+    Days per phase for a cycle of target_cycle_length days, in proportion to
+    MoonPhaseLengthDays, by largest remainder apportionment: every phase gets
+    the whole days of its share and the days left over go to the largest
+    fractional parts.  The principal phases ('x' in MoonPhaseChecker) get at
+    least one day while the cycle has room for all of them.  Shares are kept
+    as integer fractions, so ties are exact, and the work does not grow with
+    the cycle length.
+
+    Returns (days per phase, total); total is always target_cycle_length.
+    """
+    n = int(target_cycle_length)
+    # principal phases whose share is under a day are pinned to one day, and
+    # the rest of the cycle is shared out among the other phases
+    room   = n >= sum(_PRINCIPAL)
+    pinned = [room and x and n * d < DEFAULT_LUNAR_CYCLE_LENGTH
+              for x, d in zip(_PRINCIPAL, _PHASE_DAYS)]
+    seats  = n - sum(pinned)
+    denom  = sum(d for d, pin in zip(_PHASE_DAYS, pinned) if not pin)
+
+    days, rems = [], []
+    for d, pin in zip(_PHASE_DAYS, pinned):
+        q, r = divmod(seats * d, denom) if not pin else (1, -1)
+        days.append(q)
+        rems.append(r)
+    left = n - sum(days)
+    # stable sort: equal remainders keep _TIE_ORDER
+    for i in sorted(_TIE_ORDER, key=rems.__getitem__, reverse=True)[:left]:
+        days[i] += 1
+
+    return dict(zip(LUNAR_PHASES, days)), n
+
+
+def calculate_moonrise_times(target_cycle_length, start_phase='Full Moon',
+                             sunset_hour=SUNSET_HOUR, sunrise_hour=SUNRISE_HOUR):
     scaled_phases, new_total_days = get_num_phases(target_cycle_length)
 
     orig_seq = []
@@ -217,7 +312,7 @@ def calculate_moonrise_times(target_cycle_length, start_phase='Full Moon'):
 
     scale_factor      = float(target_cycle_length) / 29.5
     kickback          = DEFAULT_LATER_PER_DAY / scale_factor
-    base_time_minutes = SUNSET_HOUR * 60
+    base_time_minutes = sunset_hour * 60
 
     results = []
     last_new_moon_day = None
@@ -236,13 +331,13 @@ def calculate_moonrise_times(target_cycle_length, start_phase='Full Moon'):
                 total_rise_minutes = base_time_minutes + offset_minutes
                 rise_h, rise_m     = divmod(total_rise_minutes, 60)
                 moonrise_time      = datetime.time(rise_h % 24, rise_m)
-                moonset_time       = datetime.time(SUNRISE_HOUR, 0)
+                moonset_time       = datetime.time(sunrise_hour, 0)
             else:
                 # Post-New Moon
-                moonrise_time       = datetime.time(SUNSET_HOUR, 0)
+                moonrise_time       = datetime.time(sunset_hour, 0)
                 days_since_new      = d - last_new_moon_day
                 offset_after_new    = int(round(days_since_new * kickback))
-                total_set_minutes   = (SUNSET_HOUR * 60) + offset_after_new
+                total_set_minutes   = (sunset_hour * 60) + offset_after_new
                 set_h, set_m        = divmod(total_set_minutes, 60)
                 moonset_time        = datetime.time(set_h % 24, set_m)
 
@@ -272,6 +367,39 @@ def calculate_moonrise_times(target_cycle_length, start_phase='Full Moon'):
 
     return results
 
+
+class ScheduleEntry(dict):
+    """One read-only schedule day; cached schedules are shared, so no writes."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("schedule entries are read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        # rebuild through __init__ so pickling (engine socket) still works
+        return (ScheduleEntry, (dict(self),))
+
+
+# Distinct (cycle length, start phase, sunset, sunrise) schedules kept around.
+SCHEDULE_CACHE_SIZE = 32
+
+@functools.lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def _cached_schedule(target_cycle_length, start_phase, sunset_hour, sunrise_hour):
+    return tuple(ScheduleEntry(entry) for entry in calculate_moonrise_times(
+        target_cycle_length, start_phase, sunset_hour, sunrise_hour))
+
+def get_schedule(target_cycle_length, start_phase='Full Moon',
+                 sunset_hour=SUNSET_HOUR, sunrise_hour=SUNRISE_HOUR):
+    """
+    Memoized calculate_moonrise_times(): the same settings return the same
+    immutable tuple of ScheduleEntry objects, evicting the least recently
+    used schedule beyond SCHEDULE_CACHE_SIZE.
+    """
+    return _cached_schedule(int(target_cycle_length), start_phase,
+                            sunset_hour, sunrise_hour)
+
 def compute_cycle_start_date(start_time_str: str) -> datetime.datetime:
     """Return a datetime that matches the user-supplied HH:MM today."""
     now = datetime.datetime.now()
@@ -288,11 +416,7 @@ def set_moon_phase_angle(day, cycle_length):
     return 180 * (1.0 - abs(1.0 - 2.0 * y / cycle_length))
 
 def find_schedule_entry_for_time(schedule, cycle_start_date, sim_time):
-    start_dt      = cycle_start_date
-    today         = start_dt.date()
-    first_sunrise = datetime.datetime.combine(today, datetime.time(SUNRISE_HOUR, 0))
-    if start_dt >= first_sunrise:
-        first_sunrise += datetime.timedelta(days=1)
+    first_sunrise = _first_sunrise(cycle_start_date)
 
     if sim_time < first_sunrise:
         lunar_day = 1
@@ -305,6 +429,138 @@ def find_schedule_entry_for_time(schedule, cycle_start_date, sim_time):
 
     return schedule[lunar_day - 1]
 
+def _first_sunrise(cycle_start_date):
+    first = datetime.datetime.combine(cycle_start_date.date(), datetime.time(SUNRISE_HOUR, 0))
+    if cycle_start_date >= first:
+        first += datetime.timedelta(days=1)
+    return first
+
+def seek_time(cycle_start_date, user_cycle_length, day=None, time_of_day=None,
+              progress=None):
+    """
+    Sim datetime for a point in the cycle, in constant time: `progress`
+    (percent of the cycle), or cycle `day` (1-based, as in the schedule; the
+    sunrise-to-sunrise window find_schedule_entry_for_time maps to it) at
+    `time_of_day` ("HH:MM", default sunset).  Clamped to the cycle.
+    """
+    cycle_end = cycle_start_date + datetime.timedelta(days=user_cycle_length)
+    if progress is not None:
+        target = cycle_start_date + (cycle_end - cycle_start_date) * (float(progress) / 100.0)
+    else:
+        day = int(day)
+        if not 1 <= day <= user_cycle_length:
+            raise ValueError(f"day must be between 1 and {user_cycle_length}")
+        h, m = map(int, (time_of_day or f"{SUNSET_HOUR}:00").split(':'))
+        if day == 1:
+            window = cycle_start_date
+        else:
+            window = _first_sunrise(cycle_start_date) + datetime.timedelta(days=day - 2)
+        target = window.replace(hour=h, minute=m, second=0, microsecond=0)
+        if target < window:
+            target += datetime.timedelta(days=1)
+    return max(cycle_start_date, min(target, cycle_end - datetime.timedelta(minutes=1)))
+
+def day_night_counts(cycle_start_date, sim_time):
+    """
+    The loop's (day_count, night_count) once it has counted every sunrise up
+    to and including sim_time, without stepping there.
+    """
+    before        = cycle_start_date - datetime.timedelta(microseconds=1)
+    starts_by_day = SUNRISE_HOUR <= before.hour < SUNSET_HOUR
+    sunrises      = daily_crossings(before, sim_time, SUNRISE_HOUR * 60)
+    if sunrises == 0:
+        return (1, 0) if starts_by_day else (0, 1)
+    day_count = sunrises + (1 if starts_by_day else 0)
+    return day_count, day_count - 1
+
+def daily_crossings(prev_time, cur_time, minute_of_day):
+    """
+    How many times the wall-clock time `minute_of_day` (minutes after
+    midnight) occurs in the interval (prev_time, cur_time].  Lets per-tick
+    checks fire a daily event exactly once however large the step was.
+    """
+    if cur_time <= prev_time:
+        return 0
+    h, m = divmod(int(minute_of_day), 60)
+    first = datetime.datetime.combine(prev_time.date(), datetime.time(h, m))
+    if first <= prev_time:
+        first += datetime.timedelta(days=1)
+    if first > cur_time:
+        return 0
+    return 1 + (cur_time - first) // datetime.timedelta(days=1)
+
+# The per-tick core (CycleStepper) keeps sim time as an integer: microseconds
+# since the cycle start, timedelta's own resolution, so converting back and
+# forth is exact.  Datetimes are only built at the edges (logs, snapshots,
+# checkpoints, seeks).
+US_PER_S      = 1_000_000
+US_PER_MINUTE = 60 * US_PER_S
+US_PER_DAY    = 24 * 60 * US_PER_MINUTE
+_ONE_US       = datetime.timedelta(microseconds=1)
+
+class CycleClock:
+    """Integer sim time (microseconds since cycle_start_date) of one run."""
+
+    def __init__(self, cycle_start_date):
+        self.cycle_start_date = cycle_start_date
+        midnight = datetime.datetime.combine(cycle_start_date.date(), datetime.time())
+        # time of day of sim time 0, and sim time of the first sunrise
+        self.start_tod_us     = (cycle_start_date - midnight) // _ONE_US
+        self.first_sunrise_us = self.to_us(_first_sunrise(cycle_start_date))
+
+    def to_us(self, sim_time):
+        return (sim_time - self.cycle_start_date) // _ONE_US
+
+    def to_datetime(self, sim_us):
+        return self.cycle_start_date + datetime.timedelta(microseconds=sim_us)
+
+    def is_day(self, sim_us):
+        tod = (self.start_tod_us + sim_us) % US_PER_DAY
+        return SUNRISE_HOUR * 60 * US_PER_MINUTE <= tod < SUNSET_HOUR * 60 * US_PER_MINUTE
+
+    def crossings(self, prev_us, cur_us, minute_of_day):
+        """daily_crossings on sim microseconds."""
+        if cur_us <= prev_us:
+            return 0
+        shift = self.start_tod_us - minute_of_day * US_PER_MINUTE
+        return (cur_us + shift) // US_PER_DAY - (prev_us + shift) // US_PER_DAY
+
+    def entry_index(self, sim_us, days):
+        """Index of find_schedule_entry_for_time's entry in a `days`-long schedule."""
+        if sim_us < self.first_sunrise_us:
+            return 0
+        return min((sim_us - self.first_sunrise_us) // US_PER_DAY + 1, days - 1)
+
+    def moon_window(self, schedule_entry):
+        """
+        (rise_us, set_us, visible_s) of the entry as calculate_current_altitude
+        places it, or the entry's constant altitude (-1 at New Moon, 0 with
+        no rise or set).
+        """
+        if schedule_entry['phase'] == 'New Moon':
+            return -1
+        if not schedule_entry['moonrise_time'] or not schedule_entry['moonset_time']:
+            return 0
+        rise, set_ = (self.to_us(t) for t in _rise_set(schedule_entry, self.cycle_start_date))
+        return rise, set_, (set_ - rise) / US_PER_S
+
+def window_altitude(window, sim_us):
+    """calculate_current_altitude for a CycleClock.moon_window."""
+    if not isinstance(window, tuple):
+        return window
+    rise, set_, visible_s = window
+    # before the rise time: push the clock forward by 24 h into the window
+    if sim_us < rise:
+        sim_us += US_PER_DAY
+    if sim_us > set_:
+        return 0
+    progress = (sim_us - rise) / US_PER_S / visible_s
+    return 90.0 * (1.0 - math.cos(math.pi * progress))
+
+def hhmm_to_minutes(hhmm):
+    h, m = map(int, hhmm.split(':'))
+    return h * 60 + m
+
 def find_first_day_with_phase(schedule, target_phase):
     """
     Return the zero-based index of the FIRST day in schedule whose 'phase' matches target_phase.
@@ -342,125 +598,109 @@ def calculate_current_altitude(schedule_entry, specific_time, cycle_start_date):
     total_vis = (moonset_dt - moonrise_dt).total_seconds()
     time_since_rise = (specific_time - moonrise_dt).total_seconds()
     progress = time_since_rise / total_vis
-    return 90.0 * (1.0 - np.cos(np.pi * progress))
+    return 90.0 * (1.0 - math.cos(math.pi * progress))
+
+def _rise_set(schedule_entry, cycle_start_date):
+    """(moonrise, moonset) datetimes as calculate_current_altitude places them."""
+    entry_date  = cycle_start_date.date() + datetime.timedelta(days=schedule_entry['day'])
+    moonrise_dt = datetime.datetime.combine(entry_date, schedule_entry['moonrise_time'])
+    moonset_dt  = datetime.datetime.combine(entry_date, schedule_entry['moonset_time'])
+    if moonset_dt <= moonrise_dt:
+        moonset_dt += datetime.timedelta(days=1)
+    return moonrise_dt, moonset_dt
+
+def altitude_array(schedule, times, cycle_start_date):
+    """
+    calculate_current_altitude for a whole NumPy array of datetime64 sim
+    times in one pass.  `schedule` is one entry (any `times` shape) or a
+    sequence of entries, one per row of a 2-D `times`.
+    """
+    import numpy as np
+    entries = [schedule] if isinstance(schedule, dict) else list(schedule)
+    times   = np.asarray(times, dtype='datetime64[us]')
+    if isinstance(schedule, dict):
+        times = times[np.newaxis, ...]
+    shape = (len(entries),) + (1,) * (times.ndim - 1)
+
+    visible = np.array([e['phase'] != 'New Moon' and bool(e['moonrise_time'])
+                        and bool(e['moonset_time']) for e in entries])
+    rise = np.empty(len(entries), dtype='datetime64[us]')
+    sset = np.empty(len(entries), dtype='datetime64[us]')
+    for i, entry in enumerate(entries):
+        if visible[i]:
+            rise[i], sset[i] = _rise_set(entry, cycle_start_date)
+        else:
+            rise[i] = sset[i] = np.datetime64(cycle_start_date, 'us')
+    rise, sset = rise.reshape(shape), sset.reshape(shape)
+
+    t = np.where(times < rise, times + np.timedelta64(1, 'D'), times)
+    span     = np.maximum((sset - rise) / np.timedelta64(1, 's'), 1.0)
+    progress = ((t - rise) / np.timedelta64(1, 's')) / span
+    alt = np.where(t > sset, 0.0, 90.0 * (1.0 - np.cos(np.pi * progress)))
+
+    new_moon = np.array([e['phase'] == 'New Moon' for e in entries]).reshape(shape)
+    alt = np.where(visible.reshape(shape), alt, np.where(new_moon, -1.0, 0.0))
+    return alt[0] if isinstance(schedule, dict) else alt
+
+def cycle_altitudes(schedule, cycle_start_date, step_minutes=1):
+    """
+    Altitude of every schedule day at every `step_minutes` of its 24 h
+    window (sunrise to sunrise, the span find_schedule_entry_for_time maps to
+    that entry), in one vectorized evaluation.  Returns (times, altitudes),
+    both shaped (days, samples per day); times before the cycle starts are
+    NaN in altitudes.
+    """
+    import numpy as np
+    step    = np.timedelta64(int(step_minutes * 60), 's')
+    offsets = np.arange(np.timedelta64(0, 's'), np.timedelta64(1, 'D'), step)
+    first   = np.datetime64(_first_sunrise(cycle_start_date), 'us')
+    starts  = first + (np.arange(len(schedule)) - 1) * np.timedelta64(1, 'D')
+    times   = starts[:, np.newaxis] + offsets[np.newaxis, :]
+    alt = altitude_array(schedule, times, cycle_start_date)
+    alt[times < np.datetime64(cycle_start_date, 'us')] = np.nan
+    return times, alt
 
 def rotate_phases(start_phase):
     idx0 = LUNAR_PHASES.index(start_phase)
     return LUNAR_PHASES[idx0:] + LUNAR_PHASES[:idx0]
 
-def plot_moon_phase_angle(schedule):
-
-    # extract days (1…N) and angles
-    days   = [entry['day']         for entry in schedule]
-    angles = [entry['phase_angle'] for entry in schedule]
-
-    # figure out what phase you began on
-    start_phase = schedule[0]['phase']
-
-    plt.figure(figsize=(8,4))
-    plt.plot(days, angles, marker='o')
-    plt.title(f"Moon Phase Angle Over Lunar Cycle (start: {start_phase})")
-    plt.xlabel("Day in Lunar Cycle")
-    plt.ylabel("Phase Angle (°)")
-    plt.ylim(0, 190.05)   
-    plt.xticks(days)
-    plt.grid(True, alpha=0.3)
+# The drawing itself lives in plots.py (setup/update pairs on explicit
+# Figures, shared with the web UI); these open it in a pyplot window, one
+# per kind of plot, redrawn in place when the plot is asked for again.
+def _show_plot(kind, *args, **kwargs):
+    import plots
+    figsize, setup, update = plots.PLOTS[kind]
+    plt = _pyplot()
+    fig = plt.figure(kind, figsize=figsize, clear=True)
+    update(fig, setup(fig), *args, **kwargs)
     plt.show(block=False)
+    return fig
 
+def plot_moon_phase_angle(schedule):
+    return _show_plot("phase_angle", schedule)
 
 def plot_moon_schedule_times(schedule):
     """
     Plot moonrise (blue) and moonset (red) times for each cycle-day,
     using entry['day'] (1…N) as the x-axis.
     """
-    def to_decimal_hour(t):
-        return t.hour + t.minute / 60.0 if t else None
-
-    days       = []
-    rise_hours = []
-    set_hours  = []
-
-    for entry in schedule:
-        day_label = entry['day'] - 1   # already 1…N
-        days.append(day_label)
-        rise_hours.append(to_decimal_hour(entry['moonrise_time']))
-        set_hours.append(to_decimal_hour(entry['moonset_time']))
-
-    plt.figure(figsize=(10,7))
-    plt.plot(days, rise_hours, marker='o', label='Moonrise')
-    plt.plot(days, set_hours,  marker='o', label='Moonset')
-    plt.title('Moonrise and Moonset Times')
-    plt.xlabel('Day in Lunar Cycle')
-    plt.ylabel('Time of Day (Hours)')
-    plt.xticks(range(1, len(schedule)+1))
-    plt.yticks(range(0, 28, 2))
-    plt.ylim(0, 28)
-    plt.grid(True)
-    plt.legend()
-    plt.show(block=False)
-
+    return _show_plot("rise_set", schedule)
 
 def plot_moon_schedule_phases(schedule):
-    start_phase = schedule[0]['phase']
-    rotated     = rotate_phases(start_phase)
-
-    days          = []
-    phase_indices = []
-
-    for entry in schedule:
-        days.append(entry['day'])  # 1…N
-        # find this day's phase index in the rotated list
-        phase_indices.append(rotated.index(entry['phase']))
-
-    plt.figure(figsize=(10,4))
-    plt.scatter(days, phase_indices, marker='o')
-    plt.yticks(range(len(rotated)), rotated)
-    plt.xlabel("Day in Lunar Cycle")
-    plt.ylabel("Lunar Phase")
-    plt.title("Lunar Phase by Day")
-    plt.grid(True, alpha=0.3)
-    plt.show(block=False)
-
+    return _show_plot("phases", schedule)
 
 def plot_hourly_altitude(schedule_entry, cycle_start_date, marker_interval=60):
-    mr = schedule_entry['moonrise_time']
-    ms = schedule_entry['moonset_time']
-    if not mr or not ms:
+    if not schedule_entry['moonrise_time'] or not schedule_entry['moonset_time']:
         print("No moon visibility for this day.")
-        return
-
-    entry_date = cycle_start_date + datetime.timedelta(days=schedule_entry['day'])
-    moonrise_dt = datetime.datetime.combine(entry_date, mr)
-    moonset_dt  = datetime.datetime.combine(entry_date, ms)
-    if moonset_dt <= moonrise_dt:
-        moonset_dt += datetime.timedelta(days=1)
+        return None
+    return _show_plot("altitude", schedule_entry, cycle_start_date, marker_interval)
 
-    time_points = []
-    altitudes   = []
-
-    current = moonrise_dt
-    while current <= moonset_dt:
-        alt = calculate_current_altitude(schedule_entry, current, cycle_start_date)
-        time_points.append(current)
-        altitudes.append(alt)
-        current += datetime.timedelta(minutes=marker_interval)
-
-    plt.figure(figsize=(10,5))
-    plt.plot(time_points, altitudes, color='purple')
-    plt.scatter(time_points, altitudes, color='red', s=20)
-    plt.title(f"Hourly Altitude (Day {schedule_entry['day']} - {schedule_entry['phase']})")
-    plt.xlabel("Time")
-    plt.ylabel("Altitude (degrees)")
-
-    hours = mdates.HourLocator()
-    fmt   = mdates.DateFormatter('%H:%M')
-    plt.gca().xaxis.set_major_locator(hours)
-    plt.gca().xaxis.set_major_formatter(fmt)
-    plt.gcf().autofmt_xdate()
-
-    plt.ylim(0, 200)
-    plt.grid(True, alpha=0.3)
-    plt.show(block=False)
+def plot_cycle_heatmap(schedule, cycle_start_date, step_minutes=5):
+    """
+    Day x time-of-day heatmaps of the whole cycle: moon altitude and light
+    brightness (see plots.cycle_heatmap_data).
+    """
+    return _show_plot("cycle_heatmap", schedule, cycle_start_date, step_minutes)
 
 def prompt_phase_with_skip(prompt, current_value):
     while True:
@@ -627,235 +867,382 @@ def user_input_thread(command_queue, state):
         if cmd == 'q':
             break
 
-def simulation_loop(
-        schedule,
-        cycle_start_date,
-        user_cycle_length,
-        update_interval_minutes,
-        speed_factor,
-        day_length_in_real_seconds,
-        hex_color,
-        feed_start_time,
-        feed_end_time,
-        independent_timer,
-        drop_countdown,
-        end_feed_countdown,
-        stop_event,
-        shared_state=None
-):
-    real_secs_per_sim_minute = day_length_in_real_seconds / (24 * 60.0)
-    sim_minutes_per_update   = 1.0 / 100.0
-    real_secs_per_update     = real_secs_per_sim_minute / 100.0 / speed_factor
-
-    # Initialize simulation clock
-    simulation_time = cycle_start_date
-    
-
-    # Set up display
-    disp = OLED_1in27_rgb.OLED_1in27_rgb()
-    disp.Init()
-    disp.clear()
-
-    # Track whether we've drawn day or night frame
-    day_frame_drawn   = False
-    night_frame_drawn = False
-
-    # State for servo + feeder threads
-    servo_thread = None
-    global feeder_thread
-    feeder_thread = None
-    global compare_alt
-    compare_alt = None
-
-    sun_arm_moved = False
-    moon_reset_moved = False
-    sun_reset_moved = False
-
-    feeder_dropped = False
-
-    
-
-
-    # Determine initial mode
-    prev_is_day = SUNRISE_HOUR <= simulation_time.hour < SUNSET_HOUR
-    if prev_is_day:
-        day_count   = 1
-        night_count = 0
-    else:
-        day_count   = 0
-        night_count = 1
+class CycleStepper:
+    """
+    What one tick of a run does, whoever paces the ticks: day/night frames,
+    sunrise/sunset and phase events, where the arm should go, sim-time
+    feeding, status snapshots and checkpoints.  simulation_loop steps it from
+    its thread, aioengine from an asyncio task.
+
+    The hardware is only reached through callbacks, so each runtime decides
+    how moves run:
+        arm_busy()                      True while an arm move is under way
+        move_arm(target, delay, step)   start moving the arm to `target`
+        feed(action)                    run drop_feeder/shake_feeder(feeder)
+        show(color)                     fill the display with '#RRGGBB'
+
+    Sim times are integer microseconds since cycle_start_date (self.clock, a
+    CycleClock), so a tick allocates no datetimes; `events` must be an
+    EventLog with sim_epoch=cycle_start_date.  step() must be called with
+    non-decreasing sim times (each tick covers the interval since the
+    previous one, see daily_crossings); seek() jumps.
+    """
 
-    print("\n[Simulation Thread] Started.")
-    print(f" Independent Timer: {independent_timer}")
+    def __init__(self, schedule, cycle_start_date, user_cycle_length, hex_color,
+                 feed_start_time, feed_end_time, independent_timer, events,
+                 arm, feeder, arm_busy, move_arm, feed, show,
+                 shared_state=None, checkpoint=None):
+        self.schedule          = schedule
+        self.cycle_start_date  = cycle_start_date
+        self.clock             = CycleClock(cycle_start_date)
+        self.hex_color         = hex_color
+        self.independent_timer = independent_timer
+        self.events            = events
+        self.arm               = arm
+        self.feeder            = feeder
+        self.arm_busy          = arm_busy
+        self.move_arm          = move_arm
+        self.feed              = feed
+        self.show              = show
+        self.shared_state      = shared_state
+        self.checkpoint        = checkpoint
+        self.total_cycle_secs  = user_cycle_length * 24 * 3600
+        self.moon_windows      = [self.clock.moon_window(entry) for entry in schedule]
+
+        # Daily boundary events are detected as crossings of their time of
+        # day between the previous tick and this one, so each fires exactly
+        # once whatever the step.  The first tick covers its own start instant.
+        self.sunrise_minute    = SUNRISE_HOUR * 60
+        self.sunset_minute     = SUNSET_HOUR * 60
+        self.feed_start_minute = hhmm_to_minutes(feed_start_time)
+        self.feed_end_minute   = hhmm_to_minutes(feed_end_time)
+
+        self._reset(0)
+        events.log('sim', "Started. Independent Timer: %s", 0, independent_timer)
+
+    def _reset(self, sim_us):
+        self.prev_sim_us = sim_us - 1
+        self.day_count, self.night_count = day_night_counts(
+            self.cycle_start_date, self.clock.to_datetime(self.prev_sim_us))
+        # Track whether we've drawn day or night frame
+        self.day_frame_drawn   = False
+        self.night_frame_drawn = False
+        self.sun_arm_moved     = False
+        self.moon_reset_moved  = False
+        self.moon_up           = None
+        self.prev_phase        = None
+        self.next_snapshot_at    = 0.0
+        self.last_snapshot_phase = None
+
+    def seek(self, sim_us):
+        """
+        Continue from `sim_us`; the next step() retargets the arm, which
+        moves there on a normal profile.  Daily events between the old and
+        new time are skipped, not replayed.
+        """
+        self._reset(sim_us)
+        self.events.log('sim', "Seek", sim_us)
+        if self.checkpoint is not None:
+            self.checkpoint.update(self.clock.to_datetime(sim_us),
+                                   self.arm.angle, self.feeder.angle, force=True)
+
+    def step(self, sim_us):
+        events = self.events
+        clock  = self.clock
+        prev_sim_us = self.prev_sim_us
 
-    while not stop_event.is_set():
-        world_time = datetime.datetime.now()
-        real_world_time = datetime.datetime.now()
-        #print(f"Real World Time: {real_world_time:%Y-%m-%d %H:%M}")
-        
         # Determine day/night
-        is_day = SUNRISE_HOUR <= simulation_time.hour < SUNSET_HOUR
+        is_day = clock.is_day(sim_us)
 
         # Draw a blank frame on transition
-        if is_day and not day_frame_drawn:
-            img = Image.new('RGB', (disp.width, disp.height), SUN_COLOR)
-            disp.ShowImage(disp.getbuffer(img))
-            day_frame_drawn   = True
-            night_frame_drawn = False
+        if is_day and not self.day_frame_drawn:
+            self.show(SUN_COLOR)
+            self.day_frame_drawn   = True
+            self.night_frame_drawn = False
 
-        elif not is_day and not night_frame_drawn:
-            base_hex = "#" + hex_color
-            img = Image.new('RGB', (disp.width, disp.height), base_hex)
-            disp.ShowImage(disp.getbuffer(img))
-            night_frame_drawn = True
-            day_frame_drawn   = False
+        elif not is_day and not self.night_frame_drawn:
+            self.show("#" + self.hex_color)
+            self.night_frame_drawn = True
+            self.day_frame_drawn   = False
 
         # Update sunrise/sunset counters
-        if is_day and not prev_is_day:
-            night_count = day_count
-            day_count  += 1
-        elif not is_day and prev_is_day:
-            day_count = night_count + 1
-        prev_is_day = is_day
+        if clock.crossings(prev_sim_us, sim_us, self.sunrise_minute):
+            self.night_count = self.day_count
+            self.day_count  += 1
+            events.log('sun', "Sunrise, day %d", sim_us, self.day_count)
+        if clock.crossings(prev_sim_us, sim_us, self.sunset_minute):
+            self.day_count = self.night_count + 1
+            events.log('sun', "Sunset", sim_us)
 
         # Find current schedule entry
-        entry = find_schedule_entry_for_time(schedule, cycle_start_date, simulation_time)
+        index = clock.entry_index(sim_us, len(self.schedule))
+        entry = self.schedule[index]
 
-        # Compute altitude & phase angle
+        # Compute altitude & phase angle (the status line is only formatted
+        # when the rate limit lets it through)
         if is_day:
             altitude_deg = 90.0
-            print(f"[Sim {simulation_time:%Y-%m-%d %H:%M}] Day {day_count} – Sun is out (alt=90°).")
+            events.log('status', "Day %d – Sun is out (alt=90°).", sim_us, self.day_count)
         else:
-            altitude_deg = calculate_current_altitude(entry, simulation_time, cycle_start_date)
+            altitude_deg = window_altitude(self.moon_windows[index], sim_us)
             if altitude_deg > 0:
-                print(f"[Sim {simulation_time:%Y-%m-%d %H:%M}] "
-                      f"Night {night_count} – Phase: {entry['phase']} "
-                      f"– Altitude: {altitude_deg:.1f}° – Phase Angle: {entry['phase_angle']:.2f}")
+                events.log('status', "Night %d – Phase: %s – Altitude: %.1f° – Phase Angle: %.2f",
+                           sim_us, self.night_count, entry['phase'], altitude_deg,
+                           entry['phase_angle'])
             else:
-                print(f"[Sim {simulation_time:%Y-%m-%d %H:%M}] Night {night_count} – Moon not visible (alt=0).")
-                
+                events.log('status', "Night %d – Moon not visible (alt=0).", sim_us,
+                           self.night_count)
+
+        if entry['phase'] != self.prev_phase:
+            events.log('phase', "Phase: %s (phase angle %.2f)", sim_us,
+                       entry['phase'], entry['phase_angle'])
+            self.prev_phase = entry['phase']
+        if not is_day and (altitude_deg > 0) != self.moon_up:
+            self.moon_up = altitude_deg > 0
+            events.log('moon', "Moonrise" if self.moon_up else "Moon not visible", sim_us)
+        elif is_day:
+            self.moon_up = None
+
         if is_day:
-            sun_reset_moved = False
-            moon_reset_moved = False
-            if not sun_arm_moved and (servo_thread is None or not servo_thread.is_alive()):
-                compare_alt = 90
-                print("GOING TO 90°")
-                servo_thread = threading.Thread(
-                    target=move_arm, args=(current_servo_angle, 90), daemon=True
-                )
-                servo_thread.start()
-                sun_arm_moved = True
+            self.moon_reset_moved = False
+            if not self.sun_arm_moved and not self.arm_busy():
+                events.log('arm', "GOING TO 90°", sim_us)
+                self.move_arm(90)
+                self.sun_arm_moved = True
 
         elif altitude_deg > 0:
-            moon_reset_moved = False
-            sun_arm_moved    = False
-            target = altitude_deg
-
-            if servo_thread is None or not servo_thread.is_alive():
-                # print("Moving freely with Moon")
-                if target != current_servo_angle:
-                    servo_thread = threading.Thread(
-                        target=move_arm_zero,
-                        args=(current_servo_angle, target, 0.06, 1),
-                        daemon=True
-                    )
-                    servo_thread.start()
-            elif servo_thread is None and not sun_reset_moved:
-                # print("Exiting Sun Position")
-                if target != current_servo_angle and target > 90:
-                    servo_thread = threading.Thread(
-                        target=move_arm_zero, args=(current_servo_angle, 180, 0.06, 1), daemon=True
-                    )
-                    servo_thread.start()
-                    sun_reset_moved = True
-                elif target != current_servo_angle and target < 90:
-                    servo_thread = threading.Thread(
-                        target=move_arm_zero, args=(current_servo_angle, 0, 0.06, 1), daemon=True
-                    )
-                    servo_thread.start()
-                    sun_reset_moved = True
+            self.moon_reset_moved = False
+            self.sun_arm_moved    = False
+            # follow the moon whenever the previous move has finished
+            if not self.arm_busy() and altitude_deg != self.arm.angle:
+                self.move_arm(altitude_deg, 0.06, 1)
 
         else:
-            if (servo_thread is None or not servo_thread.is_alive()) and not moon_reset_moved:
-                print("Moon not Visible, ENTERING 0°")
-                servo_thread = threading.Thread(
-                    target=move_arm_zero, args=(current_servo_angle, 0, 0.05, 1), daemon=True
+            if not self.arm_busy() and not self.moon_reset_moved:
+                events.log('arm', "Moon not Visible, ENTERING 0°", sim_us)
+                self.move_arm(0, 0.05, 1)
+                self.moon_reset_moved = True
+
+        if not self.independent_timer and clock.crossings(prev_sim_us, sim_us,
+                                                          self.feed_start_minute):
+            events.log('feed', "It's FEEDING TIME", sim_us)
+            self.feed(drop_feeder)
+
+        if not self.independent_timer and clock.crossings(prev_sim_us, sim_us,
+                                                          self.feed_end_minute):
+            events.log('feed', "Feeding over, shaking feeder", sim_us)
+            self.feed(shake_feeder)
+
+        # With independent_timer on, feeding follows the wall clock instead
+        # and is driven by set_feed_alarms/AlarmService, not by the stepper.
+
+        if self.shared_state is not None:
+            phase_name = entry['phase'] if altitude_deg > 0 else 'Sun / No Moon'
+            now_mono   = time.monotonic()
+            if now_mono >= self.next_snapshot_at or phase_name != self.last_snapshot_phase:
+                elapsed_s = sim_us / US_PER_S
+                # a single reference assignment is atomic, readers need no lock
+                self.shared_state['snapshot'] = SimSnapshot(
+                    sim_time    = clock.to_datetime(sim_us),
+                    elapsed_s   = elapsed_s,
+                    progress    = elapsed_s / self.total_cycle_secs * 100.0,
+                    phase       = phase_name,
+                    phase_angle = entry['phase_angle'],
+                    altitude    = altitude_deg,
+                    is_day      = is_day,
                 )
-                servo_thread.start()
-                moon_reset_moved = True
-
-        if simulation_time.strftime('%H:%M') == feed_start_time and not independent_timer:
-            print("It's FEEDING TIME")
-            feeder_thread = threading.Thread(target=drop_feeder, daemon=True)
-            feeder_thread.start()
-
-        if simulation_time.strftime('%H:%M') == feed_end_time and not independent_timer:
-            feeder_thread = threading.Thread(target=shake_feeder, daemon=True)
-            feeder_thread.start()
-        
-        
-
-        
-        if independent_timer and real_world_time.strftime('%H:%M') == drop_countdown and ((feeder_thread is None) or (not feeder_thread.is_alive())):
-            print("Independent Timer Started")
-            print(end_feed_countdown)
-            feeder_thread = threading.Thread(target=drop_alarm, daemon=True)
-            feeder_thread.start()
-        if independent_timer and real_world_time.strftime('%H:%M') == end_feed_countdown and ((feeder_thread is None) or (not feeder_thread.is_alive())):
-            print("Independent Timer Ended")
-            feeder_thread = threading.Thread(target=feeding_alarm, daemon=True)
-            feeder_thread.start()
-
-        if shared_state is not None:
-            shared_state['sim_time']            = simulation_time
-            elapsed                             = simulation_time - cycle_start_date
-            total_sec                           = user_cycle_length * 24 * 3600
-            shared_state['progress']            = (elapsed.total_seconds() / total_sec) * 100.0
-            shared_state['current_altitude']    = altitude_deg
-            if altitude_deg > 0:
-                shared_state['current_phase']       = entry['phase']
-                shared_state['current_phase_angle'] = entry['phase_angle']
-            else:
-                shared_state['current_phase']       = 'Sun / No Moon'
-                shared_state['current_phase_angle'] = entry['phase_angle']
+                self.last_snapshot_phase = phase_name
+                self.next_snapshot_at    = now_mono + SNAPSHOT_INTERVAL_S
 
-        # Advance simulation clock
-        simulation_time += datetime.timedelta(minutes=sim_minutes_per_update)
-        time.sleep(real_secs_per_update)
+        # the write itself happens off-thread
+        if self.checkpoint is not None and self.checkpoint.due():
+            self.checkpoint.update(clock.to_datetime(sim_us), self.arm.angle, self.feeder.angle)
+
+        self.prev_sim_us = sim_us
+
+
+def simulation_loop(
+        schedule,
+        cycle_start_date,
+        user_cycle_length,
+        update_interval_minutes,
+        speed_factor,
+        day_length_in_real_seconds,
+        hex_color,
+        feed_start_time,
+        feed_end_time,
+        independent_timer,
+        drop_countdown,
+        end_feed_countdown,
+        stop_event,
+        shared_state=None,
+        hardware=None,
+        arm=None,
+        feeder=None,
+        display=None,
+        fast_forward=False,
+        on_tick=None,
+        checkpoint=None
+):
+    """
+    Run the lunar cycle, driving the arm, feeder and OLED.
 
-    # On exit, clear display and reset hardware
-    disp.clear()
-    move_arm(current_servo_angle, 0)
-    reset_feeder()
-    print("[Simulation Thread] Exiting…")
+    arm/feeder/display override the devices picked from `hardware` (used with
+    mock backends).  With fast_forward the loop never sleeps: it advances
+    update_interval_minutes of sim time per tick, runs servo moves inline,
+    stays quiet per tick and returns at the end of the cycle.  on_tick, if
+    given, is called with the sim time at the start of every tick.
 
+    Tick timing (body time, sleep overshoot, sim/wall drift) is collected in a
+    TickStats, published as shared_state['tick_stats'] and logged as a 'sim'
+    event on exit (echoed to stdout unless fast_forward).
 
-    move_arm(current_servo_angle, 0)
-    reset_feeder()
+    checkpoint, a checkpoint.Checkpointer, is kept up to date with the sim
+    time and servo angles; on exit it is flushed if
+    shared_state['keep_checkpoint'] is set and deleted otherwise.
+    """
+    real_secs_per_sim_minute = day_length_in_real_seconds / (24 * 60.0)
+    sim_minutes_per_update   = 1.0 / 100.0
+    real_secs_per_update     = real_secs_per_sim_minute / 100.0 / speed_factor
+    if fast_forward:
+        sim_minutes_per_update = update_interval_minutes
+        # the independent timer follows the wall clock, meaningless here
+        independent_timer      = False
+
+    # Initialize simulation clock (integer microseconds since the cycle
+    # start, see CycleClock; datetimes are only made for on_tick and exit)
+    sim_us       = 0
+    cycle_end_us = user_cycle_length * US_PER_DAY
+    tick_us      = datetime.timedelta(minutes=sim_minutes_per_update) // _ONE_US
+
+    def spawn(target, *args):
+        # servo/feeder moves get their own thread so they don't stall the
+        # clock; in fast-forward they run to completion right here
+        if fast_forward:
+            target(*args)
+            return None
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        return thread
+
+    # state changes only, plus a rate-limited status line (see eventlog.py)
+    events = EventLog(sink=BinarySink(EVENT_LOG_PATH) if EVENT_LOG_PATH else None,
+                      echo=not fast_forward, sim_epoch=cycle_start_date)
+    if shared_state is not None:
+        shared_state['events'] = events
+
+    hardware = dict(DEFAULT_HARDWARE, **(hardware or {}))
+    if arm is None:
+        arm    = servo_for(hardware['arm_channel'], ARM_DUTY_SPAN, 0)
+    if feeder is None:
+        feeder = servo_for(hardware['feeder_channel'], FEEDER_DUTY_SPAN, FEEDER_HOME_ANGLE)
+
+    # Set up display (enclosures without the OLED just skip drawing)
+    disp = display
+    if disp is None and hardware['display']:
+        oled = _oled_driver()
+        if oled is None:
+            raise RuntimeError("waveshare_OLED driver is not installed")
+        disp = oled.OLED_1in27_rgb()
+    if disp is not None:
+        disp.Init()
+        disp.clear()
+
+    # servo/feeder moves run on their own threads (see spawn); the stepper
+    # only sees these callbacks
+    servo_thread  = None
+    feeder_thread = None
 
+    def arm_busy():
+        return servo_thread is not None and servo_thread.is_alive()
 
+    def move_arm(target, delay=0.05, step=1):
+        nonlocal servo_thread
+        servo_thread = spawn(arm.move, arm.angle, target, delay, step)
 
+    def feed(action):
+        nonlocal feeder_thread
+        feeder_thread = spawn(action, feeder)
 
+    def show(color):
+        if disp is not None:
+            img = Image.new('RGB', (disp.width, disp.height), color)
+            disp.ShowImage(disp.getbuffer(img))
 
-    can_move = (servo_thread is None) or (not servo_thread.is_alive())
-    feeder_can_move = (feeder_thread is None) or (not feeder_thread.is_alive())
-    if can_move:
-        servo_thread = threading.Thread(target=move_arm, args = (current_servo_angle, 0), daemon=True)
-        servo_thread.start()
-    else:
-        servo_thread.join()
-        servo_thread = threading.Thread(target=move_arm, args = (current_servo_angle, 0), daemon=True)
-        servo_thread.start()
-    if feeder_can_move:
-        feeder_thread = threading.Thread(target=move_feeder, args= (current_feeder_angle, 25, 0.05, 1), daemon=True)
-        feeder_thread.start()
-    else:
-        feeder_thread.join()
-        feeder_thread = threading.Thread(target=move_feeder, args=(current_feeder_angle,20,0.05, 1), daemon=True)
-        feeder_thread.start()
-    
-    
+    stepper = CycleStepper(schedule, cycle_start_date, user_cycle_length, hex_color,
+                           feed_start_time, feed_end_time, independent_timer,
+                           events, arm, feeder,
+                           arm_busy=arm_busy, move_arm=move_arm, feed=feed, show=show,
+                           shared_state=shared_state, checkpoint=checkpoint)
+
+    tick_stats = TickStats()
+    if shared_state is not None:
+        shared_state['tick_stats'] = tick_stats
+    # sim time is derived from monotonic deadlines, so per-tick work can't
+    # accumulate into drift; a late loop grows its step (up to MAX_SIM_STEP)
+    # and past that skips ahead instead of falling behind
+    pacer = PacingClock(sim_us, tick_us, real_secs_per_update,
+                        max_tick_sim=MAX_SIM_STEP // _ONE_US)
+    clock = stepper.clock
+
+    while not stop_event.is_set():
+        if fast_forward and sim_us >= cycle_end_us:
+            break
 
+        # Seek (LocalEngine.seek): jump straight to the new sim time and let
+        # this tick retarget the arm, which moves there on a normal profile.
+        seek_to = shared_state.pop('seek', None) if shared_state is not None else None
+        if seek_to is not None:
+            sim_us = clock.to_us(seek_to)
+            pacer.rebase(sim_us)
+            stepper.seek(sim_us)
+
+        if on_tick is not None:
+            on_tick(clock.to_datetime(sim_us))
+        tick_start = time.monotonic()
+
+        stepper.step(sim_us)
+
+        # Advance simulation clock
+        if fast_forward:
+            sim_us += tick_us
+            tick_stats.record_tick(time.monotonic() - tick_start)
+        else:
+            body_s = time.monotonic() - tick_start
+            pacer.adapt(body_s)
+            sim_us, skipped = pacer.wait_next()
+            # + drift: this tick starts after its deadline
+            late = pacer.lateness()
+            tick_stats.record_tick(
+                body_s      = body_s,
+                overshoot_s = late if not skipped else None,
+                drift_s     = late,
+                period_s    = pacer.tick_real_s,
+                skipped     = skipped,
+                step_s      = pacer.tick_sim / US_PER_S,
+            )
+
+    # On exit, clear display and park the hardware once, after any move
+    # still in flight
+    if disp is not None:
+        disp.clear()
+    for thread in (servo_thread, feeder_thread):
+        if thread is not None:
+            thread.join()
+    arm.move(arm.angle, 0)
+    reset_feeder(feeder)
+    if checkpoint is not None:
+        # an engine shutdown keeps the checkpoint to resume from on boot, a
+        # stop asked for by the user throws it away
+        keep = shared_state is not None and shared_state.get('keep_checkpoint', False)
+        if keep:
+            checkpoint.update(clock.to_datetime(sim_us), arm.angle, feeder.angle, force=True)
+        checkpoint.close(discard=not keep)
+    events.log('sim', "Tick timing: %s", sim_us, json.dumps(tick_stats.summary()))
+    events.log('sim', "Exiting…", sim_us)
+    events.close()
+    if TICK_STATS_PATH:
+        tick_stats.dump(TICK_STATS_PATH)
 
 
 def handle_command(cmd, arg, stop_event, state):
@@ -917,6 +1304,9 @@ def handle_command(cmd, arg, stop_event, state):
             state['drop_countdown'] = drop_countdown
         if end_feed_countdown is not None:
             state['end_feed_countdown'] = end_feed_countdown
+        # the feeder timer doesn't wait for 'start', it runs on its own
+        set_feed_alarms(state['alarms'], 'cli', state['independent_timer'],
+                        state['drop_countdown'], state['end_feed_countdown'])
 
         if new_start_phase is not None:
             state['start_phase'] = new_start_phase
@@ -927,7 +1317,7 @@ def handle_command(cmd, arg, stop_event, state):
         else:
             state['cycle_start_date'] = datetime.datetime.now()
 
-        state['moon_schedule'] = calculate_moonrise_times(
+        state['moon_schedule'] = get_schedule(
             state['user_cycle_length'],
             state.get('start_phase', 'Full Moon')
         )
@@ -966,7 +1356,7 @@ def main():
 
     start_time_str = datetime.datetime.now().strftime('%H:%M')
     cycle_start_dt = compute_cycle_start_date(start_time_str)
-    moon_schedule  = calculate_moonrise_times(user_cycle_length)
+    moon_schedule  = get_schedule(user_cycle_length)
 
     state = {
         'moon_schedule': moon_schedule,
@@ -983,6 +1373,7 @@ def main():
         'end_feed_countdown': '08:00',
         'simulation_thread': None,
         'simulation_started': False,
+        'alarms': AlarmService(),
     }
 
     command_queue = Queue()
@@ -996,12 +1387,12 @@ def main():
 
     print("Ready. Commands: pt, pp, pang, pa, change, status, start, q")
 
+    # Plots here are Agg figures (drawn, never shown), so there are no GUI
+    # events to run: the loop just sleeps until a command arrives.  Only 'q'
+    # sets stop_event, and it is handled on this thread.
     while not stop_event.is_set():
-        while not command_queue.empty():
-            cmd, arg = command_queue.get()
-            handle_command(cmd, arg, stop_event, state)
-        plt.pause(0.01)
-        time.sleep(0.1)
+        cmd, arg = command_queue.get()
+        handle_command(cmd, arg, stop_event, state)
 
     if state['simulation_thread'] is not None:
         state['simulation_thread'].join()
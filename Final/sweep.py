@@ -0,0 +1,200 @@
+"""
+Headless parameter sweep: compare configurations before committing a tank to
+a real run.
+
+    python sweep.py [--cycle-lengths 26,28,30] [--start-phases "Full Moon,New Moon"]
+                    [--feed-windows 19:00-04:00,20:00-23:00] [--speeds 1,10]
+                    [--start-time 18:00] [--step-minutes 1] [--workers N]
+                    [--csv sweep.csv]
+
+Every combination of the lists is one configuration.  Each is evaluated in a
+worker process (ProcessPoolExecutor, one per core by default):
+
+  * moonlit_h       hours of the cycle's nights with the moon above the
+                    horizon, from simulator.cycle_altitudes
+  * feed_h          hours inside the feed window over the cycle
+  * feed_moonlit_h  hours of the feed window with the moon up, and
+    overlap_pct     that as a share of feed_h
+  * arm_deg, feeder_deg   total servo travel in degrees, from the command
+                    trace of a fastforward.py run of the whole cycle
+  * run_h           how long a live run takes at that speed (the sweep itself
+                    never sleeps, so speed changes nothing else)
+
+All configurations start at the same cycle start date so their numbers are
+comparable.
+"""
+import argparse
+import csv
+import datetime
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from fastforward import run_fast_forward
+from simulator import (
+    get_schedule,
+    cycle_altitudes,
+    compute_cycle_start_date,
+    hhmm_to_minutes,
+    ARM_DUTY_SPAN,
+    FEEDER_DUTY_SPAN,
+    DEFAULT_HARDWARE,
+    LUNAR_PHASES,
+    SUNRISE_HOUR,
+    SUNSET_HOUR,
+)
+
+DAY_LENGTH_S = 86400    # day_length_in_real_seconds of a live run
+
+COLUMNS = ["cycle_length", "start_phase", "feed_start", "feed_end", "speed",
+           "moonlit_h", "feed_h", "feed_moonlit_h", "overlap_pct",
+           "arm_deg", "feeder_deg", "run_h"]
+
+
+def in_window(minute_of_day, start, end):
+    """Mask of the minutes of day inside [start, end), which may wrap midnight."""
+    if start <= end:
+        return (minute_of_day >= start) & (minute_of_day < end)
+    return (minute_of_day >= start) | (minute_of_day < end)
+
+
+def servo_travel(trace):
+    """Degrees travelled per PWM device, from the duty changes in a CommandTrace."""
+    spans = {f"pwm{DEFAULT_HARDWARE['arm_channel']}":    ARM_DUTY_SPAN,
+             f"pwm{DEFAULT_HARDWARE['feeder_channel']}": FEEDER_DUTY_SPAN}
+    last, travel = {}, dict.fromkeys(spans, 0.0)
+    for _, device, command, value in trace.events:
+        if command != "duty" or device not in spans:
+            continue
+        # the duty table is linear: duty_span is 180 degrees
+        if device in last:
+            travel[device] += abs(value - last[device]) * 180.0 / spans[device]
+        last[device] = value
+    return travel
+
+
+def evaluate(config, cycle_start_date, step_minutes=1.0):
+    """
+    The COLUMNS row, less speed and run_h, of one (cycle_length, start_phase,
+    feed_start, feed_end).
+    """
+    cycle_length, start_phase, feed_start, feed_end = config
+    schedule = get_schedule(cycle_length, start_phase)
+
+    _, alt = cycle_altitudes(schedule, cycle_start_date, step_minutes)
+    minute_of_day = (SUNRISE_HOUR * 60 + np.arange(alt.shape[1]) * step_minutes) % 1440
+    is_night = ~in_window(minute_of_day, SUNRISE_HOUR * 60, SUNSET_HOUR * 60)
+    feeding  = in_window(minute_of_day, hhmm_to_minutes(feed_start), hhmm_to_minutes(feed_end))
+    started  = ~np.isnan(alt)
+    moon_up  = started & (np.nan_to_num(alt) > 0) & is_night
+    hours    = step_minutes / 60.0
+    feed_h         = np.count_nonzero(started & feeding) * hours
+    feed_moonlit_h = np.count_nonzero(moon_up & feeding) * hours
+
+    trace = run_fast_forward(cycle_length, start_phase, cycle_start_date, step_minutes,
+                             feed_start_time=feed_start, feed_end_time=feed_end)
+    travel = servo_travel(trace)
+
+    return {
+        "cycle_length":   cycle_length,
+        "start_phase":    start_phase,
+        "feed_start":     feed_start,
+        "feed_end":       feed_end,
+        "moonlit_h":      round(np.count_nonzero(moon_up) * hours, 2),
+        "feed_h":         round(feed_h, 2),
+        "feed_moonlit_h": round(feed_moonlit_h, 2),
+        "overlap_pct":    round(100.0 * feed_moonlit_h / feed_h, 1) if feed_h else 0.0,
+        "arm_deg":        round(travel[f"pwm{DEFAULT_HARDWARE['arm_channel']}"], 1),
+        "feeder_deg":     round(travel[f"pwm{DEFAULT_HARDWARE['feeder_channel']}"], 1),
+    }
+
+
+def sweep(configs, cycle_start_date, step_minutes=1.0, workers=None,
+          day_length_s=DAY_LENGTH_S):
+    """
+    Rows for (cycle_length, start_phase, feed_start, feed_end, speed) configs,
+    in input order.  Configurations that differ only in speed are simulated
+    once.
+    """
+    configs   = list(configs)
+    unique    = list(dict.fromkeys(config[:4] for config in configs))
+    n         = len(unique)
+    workers   = workers or os.cpu_count() or 1
+    chunksize = max(1, n // (4 * workers))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = dict(zip(unique, pool.map(evaluate, unique,
+                                            itertools.repeat(cycle_start_date, n),
+                                            itertools.repeat(step_minutes, n),
+                                            chunksize=chunksize)))
+    return [dict(results[config[:4]], speed=config[4],
+                 run_h=round(config[0] * day_length_s / config[4] / 3600.0, 2))
+            for config in configs]
+
+
+def _csv_list(text, cast=str):
+    return [cast(item.strip()) for item in text.split(",") if item.strip()]
+
+
+def _feed_window(text):
+    start, _, end = text.partition("-")
+    for hhmm in (start, end):
+        datetime.datetime.strptime(hhmm, "%H:%M")
+    return start, end
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep cycle configurations in parallel.")
+    parser.add_argument("--cycle-lengths", default="28", help="comma-separated days")
+    parser.add_argument("--start-phases", default="Full Moon",
+                        help="comma-separated, from: " + ", ".join(LUNAR_PHASES))
+    parser.add_argument("--feed-windows", default="19:00-04:00",
+                        help="comma-separated HH:MM-HH:MM feeding windows")
+    parser.add_argument("--speeds", default="1", help="comma-separated speed factors")
+    parser.add_argument("--start-time", default="18:00", help="HH:MM of the first tick")
+    parser.add_argument("--step-minutes", type=float, default=1.0,
+                        help="sim minutes per tick/sample")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="worker processes (default: one per core)")
+    parser.add_argument("--csv", help="also write the results to this CSV file")
+    args = parser.parse_args()
+
+    try:
+        cycle_lengths = _csv_list(args.cycle_lengths, int)
+        feed_windows  = _csv_list(args.feed_windows, _feed_window)
+        speeds        = _csv_list(args.speeds, float)
+    except ValueError as exc:
+        parser.error(str(exc))
+    start_phases = _csv_list(args.start_phases)
+    unknown = [p for p in start_phases if p not in LUNAR_PHASES]
+    if unknown:
+        parser.error(f"unknown start phase(s): {', '.join(unknown)}")
+    if any(s <= 0 for s in speeds) or any(n < 1 for n in cycle_lengths):
+        parser.error("cycle lengths and speeds must be positive")
+
+    configs = [(n, phase, start, end, speed)
+               for n, phase, (start, end), speed
+               in itertools.product(cycle_lengths, start_phases, feed_windows, speeds)]
+    t0 = time.perf_counter()
+    rows = sweep(configs, compute_cycle_start_date(args.start_time),
+                 args.step_minutes, args.workers)
+    elapsed = time.perf_counter() - t0
+
+    widths = [max(len(col), *(len(str(row[col])) for row in rows)) for col in COLUMNS]
+    print("  ".join(col.rjust(w) for col, w in zip(COLUMNS, widths)))
+    for row in rows:
+        print("  ".join(str(row[col]).rjust(w) for col, w in zip(COLUMNS, widths)))
+    print(f"{len(rows)} configurations in {elapsed:.2f} s on {args.workers} workers")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Results written to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Timing instrumentation for simulation_loop.
+
+Every tick records how long its body took, how far time.sleep() overshot the
+requested pause and how far the sim clock has drifted from wall time.  Values
+go into HDR-style histograms: fixed memory, O(1) record, ~3% relative error
+from a microsecond up to an hour, so they can run for a whole 28-day cycle.
+"""
+import json
+import sys
+import threading
+
+SUB_BITS   = 5                      # 32 linear sub-buckets per power of two
+SUB_HALF   = 1 << (SUB_BITS - 1)
+MAX_US     = 3600 * 1000 * 1000     # values above an hour land in the top bucket
+
+
+def _bucket_index(us):
+    if us < (1 << SUB_BITS):
+        return us
+    shift = us.bit_length() - SUB_BITS
+    return ((shift + 1) << (SUB_BITS - 1)) | ((us >> shift) & (SUB_HALF - 1))
+
+
+def _bucket_value(index):
+    """Midpoint (in us) of the values that map to `index`."""
+    if index < (1 << SUB_BITS):
+        return index
+    shift = (index >> (SUB_BITS - 1)) - 1
+    low   = (SUB_HALF | (index & (SUB_HALF - 1))) << shift
+    return low + (1 << shift) / 2.0
+
+
+class LatencyHistogram:
+    """Log-linear histogram of non-negative durations given in seconds."""
+
+    def __init__(self):
+        self.counts = [0] * (_bucket_index(MAX_US) + 1)
+        self.count  = 0
+        self.total  = 0.0
+        self.min    = None
+        self.max    = 0.0
+
+    def record(self, seconds):
+        seconds = max(0.0, seconds)
+        us = min(int(seconds * 1e6), MAX_US)
+        self.counts[_bucket_index(us)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, pct):
+        """Approximate value (seconds) below which `pct` percent of samples fall."""
+        if self.count == 0:
+            return 0.0
+        target = max(1, int(round(self.count * pct / 100.0)))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(_bucket_value(index) / 1e6, self.max)
+        return self.max
+
+    def summary(self):
+        """Counts and milliseconds, ready for JSON."""
+        if self.count == 0:
+            return {"count": 0}
+        ms = lambda s: round(s * 1e3, 3)
+        return {
+            "count":   self.count,
+            "min_ms":  ms(self.min),
+            "mean_ms": ms(self.total / self.count),
+            "p50_ms":  ms(self.percentile(50)),
+            "p90_ms":  ms(self.percentile(90)),
+            "p99_ms":  ms(self.percentile(99)),
+            "p999_ms": ms(self.percentile(99.9)),
+            "max_ms":  ms(self.max),
+        }
+
+
+class TickStats:
+    """Per-tick body time, sleep overshoot and sim/wall drift of one run."""
+
+    def __init__(self):
+        self.body      = LatencyHistogram()
+        self.overshoot = LatencyHistogram()
+        self.drift     = LatencyHistogram()   # |drift|, sampled every tick
+        self.overruns  = 0                    # ticks whose body outlasted the period
+        self.skipped   = 0                    # ticks coalesced by the pacing clock
+        self.drift_s   = 0.0                  # latest drift, + means sim is behind
+        self.step_s    = None                 # latest sim seconds per tick
+        self._lock     = threading.Lock()
+
+    def record_tick(self, body_s, overshoot_s=None, drift_s=None, period_s=None,
+                    skipped=0, step_s=None):
+        with self._lock:
+            self.body.record(body_s)
+            self.skipped += skipped
+            if step_s is not None:
+                self.step_s = step_s
+            if period_s is not None and body_s > period_s:
+                self.overruns += 1
+            if overshoot_s is not None:
+                self.overshoot.record(overshoot_s)
+            if drift_s is not None:
+                self.drift.record(abs(drift_s))
+                self.drift_s = drift_s
+
+    def summary(self):
+        with self._lock:
+            return {
+                "ticks":           self.body.count,
+                "overruns":        self.overruns,
+                "skipped":         self.skipped,
+                "sim_step_s":      self.step_s,
+                "drift_s":         round(self.drift_s, 3),
+                "body":            self.body.summary(),
+                "sleep_overshoot": self.overshoot.summary(),
+                "abs_drift":       self.drift.summary(),
+            }
+
+    def dump(self, path=None):
+        """Write the summary as JSON to `path`, or pretty-print it to stdout."""
+        summary = self.summary()
+        if path:
+            with open(path, "w") as f:
+                json.dump(summary, f, indent=2)
+        else:
+            json.dump(summary, sys.stdout, indent=2)
+            sys.stdout.write("\n")
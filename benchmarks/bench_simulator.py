@@ -0,0 +1,283 @@
+"""
+Benchmarks for the simulator's schedule and per-tick functions.
+
+    python benchmarks/bench_simulator.py                # run, compare to baseline
+    python benchmarks/bench_simulator.py --save         # record a new baseline
+    python benchmarks/bench_simulator.py --quick        # fewer cycle lengths
+
+Times get_num_phases and calculate_moonrise_times for cycle lengths from 1 to
+3650 days, the per-tick path (find_schedule_entry_for_time +
+calculate_current_altitude), the integer per-tick path CycleStepper runs on
+(CycleClock.entry_index + window_altitude, reported as tick_us),
+apply_brightness_to_hex and the per-minute whole-cycle altitude grid
+(cycle_altitudes) in every implementation that has them: Final/simulator.py,
+Final/main.py, Final/final_with_feeder.py and prototype.py.  The Pi-only
+drivers the CLI scripts import (DRIVER_STUBS) are replaced by stand-ins when
+they aren't installed, since none of the timed functions touch them; a
+module that still fails to import is skipped and listed as such.
+
+get_num_phases is also checked over every cycle length from 1 to
+max(CYCLE_LENGTHS): each total must equal its target, and the longest cycle
+must time within --flat-tolerance of the default 28 days (the apportionment
+doesn't grow with the cycle).  The two are timed alternately over
+FLAT_ROUNDS rounds and the best of each compared, so scheduler noise doesn't
+fail a constant-time function.  The CLI scripts import get_num_phases from
+simulator.py, so every module is held to the same check.
+
+Results are microseconds per call (best of --repeat runs).  With a baseline
+JSON present, any result slower than baseline * --threshold is reported as a
+regression.  The script exits with status 1 on a regression or a failed
+get_num_phases check.
+"""
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import sys
+import timeit
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = {
+    "simulator": os.path.join(ROOT, "Final", "simulator.py"),
+    "main":      os.path.join(ROOT, "Final", "main.py"),
+    "final_with_feeder": os.path.join(ROOT, "Final", "final_with_feeder.py"),
+    "prototype": os.path.join(ROOT, "prototype.py"),
+}
+
+CYCLE_LENGTHS       = [1, 7, 14, 28, 29, 59, 100, 365, 1000, 3650]
+QUICK_CYCLE_LENGTHS = [1, 28, 365, 3650]
+TICK_SAMPLES        = 500       # sim times per per-tick workload
+FLAT_ROUNDS         = 25        # alternating timings per get_num_phases length
+DEFAULT_BASELINE    = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+# driver module -> names the CLI scripts import from it
+DRIVER_STUBS = {
+    "waveshare_OLED":   ["OLED_1in27_rgb"],
+    "rpi_hardware_pwm": ["HardwarePWM"],
+}
+
+
+def driver_stub(module_name, names):
+    """Stand-in for a Pi driver module whose names raise when used."""
+    stub = types.ModuleType(module_name)
+    for attr in names:
+        def unavailable(*args, _name=f"{module_name}.{attr}", **kwargs):
+            raise RuntimeError(f"{_name} is not available off the Pi")
+        setattr(stub, attr, unavailable)
+    return stub
+
+
+def stub_missing_drivers():
+    """Put stand-ins in sys.modules for drivers that don't import; their names."""
+    stubbed = []
+    for module_name, names in DRIVER_STUBS.items():
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            sys.modules[module_name] = driver_stub(module_name, names)
+            stubbed.append(module_name)
+    return stubbed
+
+
+def load_module(name, path):
+    """Import a script by path under a private name; None if it can't load."""
+    import matplotlib
+    matplotlib_use = matplotlib.use
+    # the CLI scripts ask for TkAgg at import; benchmarks never draw
+    matplotlib.use = lambda backend, *args, **kwargs: matplotlib_use("Agg")
+    sys.path.insert(0, os.path.dirname(path))
+    stubbed = stub_missing_drivers()
+    try:
+        spec = importlib.util.spec_from_file_location(f"bench_{name}", path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+    except Exception as exc:
+        print(f"  skipping {name}: {type(exc).__name__}: {exc}")
+        return None
+    finally:
+        sys.path.pop(0)
+        matplotlib.use = matplotlib_use
+        for module_name in stubbed:
+            del sys.modules[module_name]
+
+
+def time_call(fn, repeat):
+    """Best per-call time of `fn` in microseconds."""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def scaling(fn, short, long, rounds):
+    """
+    Best per-call time of fn(long) over that of fn(short).  The two are timed
+    alternately, `rounds` times each, so a load spike or clock change hits
+    both and the minimum filters it out.
+    """
+    timers = [timeit.Timer(lambda n=n: fn(n)) for n in (short, long)]
+    number = max(timer.autorange()[0] for timer in timers)
+    best   = [float("inf")] * len(timers)
+    for _ in range(rounds):
+        for i, timer in enumerate(timers):
+            best[i] = min(best[i], timer.timeit(number))
+    return best[1] / best[0]
+
+
+def tick_times(cycle_start, cycle_length):
+    """TICK_SAMPLES sim datetimes spread evenly over the cycle."""
+    step = datetime.timedelta(days=cycle_length) / TICK_SAMPLES
+    return [cycle_start + i * step for i in range(TICK_SAMPLES)]
+
+
+def bench_module(name, module, lengths, repeat):
+    results = {}
+    cycle_start = datetime.datetime(2025, 1, 1, 18, 0)
+
+    if hasattr(module, "get_num_phases"):
+        for n in lengths:
+            results[f"{name}.get_num_phases[{n}]"] = time_call(
+                lambda: module.get_num_phases(n), repeat)
+
+    if hasattr(module, "calculate_moonrise_times"):
+        for n in lengths:
+            results[f"{name}.calculate_moonrise_times[{n}]"] = time_call(
+                lambda: module.calculate_moonrise_times(n), repeat)
+
+    if hasattr(module, "find_schedule_entry_for_time"):
+        for n in (28, 365):
+            schedule = module.calculate_moonrise_times(n)
+            times    = tick_times(cycle_start, n)
+
+            def ticks():
+                for t in times:
+                    entry = module.find_schedule_entry_for_time(schedule, cycle_start, t)
+                    if entry is not None:
+                        module.calculate_current_altitude(entry, t, cycle_start)
+
+            results[f"{name}.tick[{n}]"] = time_call(ticks, repeat) / TICK_SAMPLES
+
+    if hasattr(module, "CycleClock"):
+        for n in (28, 365):
+            schedule = module.calculate_moonrise_times(n)
+            clock    = module.CycleClock(cycle_start)
+            windows  = [clock.moon_window(entry) for entry in schedule]
+            times_us = [clock.to_us(t) for t in tick_times(cycle_start, n)]
+
+            def ticks_us():
+                for t in times_us:
+                    module.window_altitude(windows[clock.entry_index(t, n)], t)
+
+            results[f"{name}.tick_us[{n}]"] = time_call(ticks_us, repeat) / TICK_SAMPLES
+
+    if hasattr(module, "cycle_altitudes"):
+        for n in (28, 365):
+            schedule = module.calculate_moonrise_times(n)
+            results[f"{name}.cycle_altitudes[{n}]"] = time_call(
+                lambda: module.cycle_altitudes(schedule, cycle_start, 1), repeat)
+
+    if hasattr(module, "apply_brightness_to_hex"):
+        results[f"{name}.apply_brightness_to_hex"] = time_call(
+            lambda: module.apply_brightness_to_hex("FF8020", 0.37), repeat)
+
+    return results
+
+
+def check_apportionment(name, module, lengths, tolerance):
+    """Print exactness and scaling of get_num_phases; True if both hold."""
+    missed = []
+    for n in range(1, max(CYCLE_LENGTHS) + 1):
+        phases, total = module.get_num_phases(n)
+        if total != n or sum(phases.values()) != n:
+            missed.append(n)
+    ref    = 28 if 28 in lengths else lengths[0]
+    spread = scaling(module.get_num_phases, ref, lengths[-1], FLAT_ROUNDS)
+    exact  = (f"exact for 1..{max(CYCLE_LENGTHS)} days" if not missed else
+              f"misses {len(missed)} lengths ({', '.join(map(str, missed[:8]))}"
+              f"{', ...' if len(missed) > 8 else ''})")
+    print(f"{name}.get_num_phases: {exact}; {lengths[-1]} vs {ref} days "
+          f"{spread:.2f}x"
+          f"{'' if spread <= tolerance else '  NOT FLAT'}")
+    return not missed and spread <= tolerance
+
+
+def compare(results, baseline, threshold):
+    """Print a comparison table and return the names that regressed."""
+    regressions = []
+    width = max(len(k) for k in results)
+    print(f"\n{'benchmark':{width}}  {'us/call':>12}  {'baseline':>12}  {'ratio':>6}")
+    for key, value in results.items():
+        base = baseline.get(key)
+        if base:
+            ratio = value / base
+            flag  = "  REGRESSION" if ratio > threshold else ""
+            if flag:
+                regressions.append(key)
+            print(f"{key:{width}}  {value:12.2f}  {base:12.2f}  {ratio:6.2f}{flag}")
+        else:
+            print(f"{key:{width}}  {value:12.2f}  {'-':>12}  {'-':>6}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the moon simulator core.")
+    parser.add_argument("--modules", default=",".join(MODULES),
+                        help="comma-separated subset of: " + ", ".join(MODULES))
+    parser.add_argument("--quick", action="store_true",
+                        help=f"only cycle lengths {QUICK_CYCLE_LENGTHS}")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="ratio to baseline counted as a regression")
+    parser.add_argument("--flat-tolerance", type=float, default=2.0,
+                        help="largest get_num_phases time ratio, longest cycle vs 28 days")
+    parser.add_argument("--save", action="store_true",
+                        help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    lengths = QUICK_CYCLE_LENGTHS if args.quick else CYCLE_LENGTHS
+    results = {}
+    loaded  = {}
+    for name in args.modules.split(","):
+        module = load_module(name, MODULES[name])
+        if module is not None:
+            loaded[name] = module
+            results.update(bench_module(name, module, lengths, args.repeat))
+
+    if not results:
+        print("Nothing could be benchmarked.")
+        return 1
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+
+    print()
+    failed = [name for name, module in loaded.items()
+              if hasattr(module, "get_num_phases")
+              and not check_apportionment(name, module, lengths, args.flat_tolerance)]
+
+    if args.save:
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "python":   platform.python_version(),
+                "machine":  platform.machine(),
+                "recorded": datetime.datetime.now().isoformat(timespec="seconds"),
+                "results":  results,
+            }, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+    elif regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold}x baseline")
+    if failed:
+        print(f"\nget_num_phases check failed for: {', '.join(failed)}")
+    return 1 if failed or (regressions and not args.save) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
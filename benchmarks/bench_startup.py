@@ -0,0 +1,74 @@
+"""
+Import-time profile of the controller entry points.
+
+    python benchmarks/bench_startup.py                  # all entry points
+    python benchmarks/bench_startup.py --modules app --top 15
+    python benchmarks/bench_startup.py --max-ms 400     # fail if slower
+
+Imports each module in a fresh interpreter with `python -X importtime` (best
+of --repeat runs) and prints the total plus the modules that cost the most
+time of their own.  Boot-to-first-frame on the Pi is dominated by these
+imports, so anything heavy showing up here (matplotlib, numpy, fonts) should
+be moved behind a first-use import.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT  = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FINAL = os.path.join(ROOT, "Final")
+
+ENTRY_POINTS = ["simulator", "engine", "enclosures", "app", "serve", "fastforward"]
+
+
+def import_profile(module):
+    """(total_us, [(self_us, cumulative_us, name), ...]) for one cold import."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=FINAL, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    total = next(c for _, c, name in reversed(rows) if name == module)
+    return total, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile entry point import times.")
+    parser.add_argument("--modules", default=",".join(ENTRY_POINTS),
+                        help="comma-separated subset of: " + ", ".join(ENTRY_POINTS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8,
+                        help="slowest modules (by own time) listed per entry point")
+    parser.add_argument("--max-ms", type=float,
+                        help="exit with status 1 if any entry point imports slower")
+    args = parser.parse_args()
+
+    too_slow = []
+    for module in args.modules.split(","):
+        try:
+            total, rows = min((import_profile(module) for _ in range(args.repeat)),
+                              key=lambda run: run[0])
+        except RuntimeError as exc:
+            print(f"{module}: skipped, import failed: {exc}")
+            continue
+        print(f"{module}: {total / 1000:.1f} ms, {len(rows)} modules")
+        for self_us, cumulative_us, name in sorted(rows, reverse=True)[:args.top]:
+            print(f"    {self_us / 1000:8.1f} ms  {name}")
+        if args.max_ms is not None and total / 1000 > args.max_ms:
+            too_slow.append(module)
+
+    if too_slow:
+        print(f"\nOver {args.max_ms} ms: {', '.join(too_slow)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
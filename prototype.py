@@ -1,8 +1,8 @@
 import time
-import math
 import datetime
 import threading
-from queue import Queue
+import os
+import sys
 
 import numpy as np
 import matplotlib
@@ -12,6 +12,13 @@ import matplotlib.dates as mdates
 
 from rpi_hardware_pwm import HardwarePWM
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), 'Final'))
+from cliplots import (plot_window, show_plot, close_plot_windows,
+                      CommandQueue, next_command)
+# the engine's phase apportionment, so a cycle length gets the same schedule
+# from the CLI as from the enclosures
+from simulator import get_num_phases
+
 SUNSET_HOUR  = 18
 SUNRISE_HOUR = 6
 DEFAULT_LUNAR_CYCLE_LENGTH = 28
@@ -27,28 +34,6 @@ LUNAR_PHASES = [
     'Waxing Gibbous'
 ]
 
-MoonPhaseLengthDays = {
-    'Full Moon':       1,
-    'Waning Gibbous':  6,
-    'Last Quarter':    1,
-    'Waning Crescent': 6,
-    'New Moon':        1,
-    'Waxing Crescent': 6,
-    'First Quarter':   1,
-    'Waxing Gibbous':  6
-}
-
-MoonPhaseChecker = {
-    'Full Moon':       'x',
-    'Waning Gibbous':  'o',
-    'Last Quarter':    'x',
-    'Waning Crescent': 'o',
-    'New Moon':        'x',
-    'Waxing Crescent': 'o',
-    'First Quarter':   'x',
-    'Waxing Gibbous':  'o'
-}
-
 DEFAULT_LATER_PER_DAY = (50 * 28) / 29
 
 
@@ -62,49 +47,6 @@ def set_servo_angle(angle):
     pwm.change_duty_cycle(duty_cycle)
     return duty_cycle
 
-def get_num_phases(target_cycle_length):
-    scalar = target_cycle_length / DEFAULT_LUNAR_CYCLE_LENGTH
-    scaled_phases = {}
-
-    for phase in LUNAR_PHASES:
-        base_length = MoonPhaseLengthDays[phase]
-        if scalar >= 1:
-            if MoonPhaseChecker[phase] == 'x':
-                new_length = math.floor(scalar * base_length)
-            else:
-                new_length = math.ceil(scalar * base_length)
-        else:
-            # scalar < 1
-            if MoonPhaseChecker[phase] == 'x':
-                new_length = math.ceil(scalar * base_length)
-            else:
-                new_length = math.floor(scalar * base_length)
-
-        scaled_phases[phase] = new_length
-
-    new_total = sum(scaled_phases.values())
-
-    # Adjust if sum doesn't match target
-    if new_total != target_cycle_length:
-        if new_total > target_cycle_length:
-            # Reduce days from 'o' phases
-            for phase in MoonPhaseChecker:
-                if MoonPhaseChecker[phase] == 'o' and scaled_phases[phase] > 0:
-                    scaled_phases[phase] -= 1
-                    new_total = sum(scaled_phases.values())
-                    if new_total == target_cycle_length:
-                        break
-        else:
-            # Add days to 'o' phases
-            for phase in MoonPhaseChecker:
-                if MoonPhaseChecker[phase] == 'o':
-                    scaled_phases[phase] += 1
-                    new_total = sum(scaled_phases.values())
-                    if new_total == target_cycle_length:
-                        break
-
-    return scaled_phases, new_total
-
 def calculate_moonrise_times(target_cycle_length):
     scaled_phases, new_total_days = get_num_phases(target_cycle_length)
     scale_factor = float(target_cycle_length) / 29.5
@@ -224,14 +166,17 @@ def plot_moon_irradiance(schedule):
     days = [entry['day'] for entry in schedule]
     irr  = [entry['irradiance_fraction'] for entry in schedule]
 
-    plt.figure(figsize=(8,4))
-    plt.plot(days, irr, marker='o', color='blue')
-    plt.title("Moon Irradiance Over Lunar Month")
-    plt.xlabel("Day in Lunar Month")
-    plt.ylabel("Irradiance Fraction")
-    plt.ylim(0, 1.05)  # small padding above 1
-    plt.grid(True, alpha=0.3)
-    plt.show(block=False)
+    ax, lines = plot_window("Moon Irradiance", (8,4))
+    if not lines:
+        lines['irr'], = ax.plot(days, irr, marker='o', color='blue')
+        ax.set_title("Moon Irradiance Over Lunar Month")
+        ax.set_xlabel("Day in Lunar Month")
+        ax.set_ylabel("Irradiance Fraction")
+        ax.set_ylim(0, 1.05)  # small padding above 1
+        ax.grid(True, alpha=0.3)
+    else:
+        lines['irr'].set_data(days, irr)
+    show_plot(ax)
 
 def plot_moon_schedule_times(schedule):
     def to_decimal_hour(t):
@@ -249,18 +194,25 @@ def plot_moon_schedule_times(schedule):
         rise_hours.append(to_decimal_hour(mr))
         set_hours.append(to_decimal_hour(ms))
 
-    plt.figure(figsize=(10,5))
-    plt.plot(days, rise_hours, marker='o', label='Moonrise', color='blue')
-    plt.plot(days, set_hours,  marker='o', label='Moonset',  color='red')
-    plt.title('Moonrise and Moonset Times')
-    plt.xlabel('Day in Lunar Cycle')
-    plt.ylabel('Time of Day (Hours)')
-    plt.xticks(range(1, max(days)+1))
-    plt.yticks(range(0, 25, 2))
-    plt.ylim(0, 24)
-    plt.grid(True)
-    plt.legend()
-    plt.show(block=False)
+    rise_hours = np.array(rise_hours, dtype=float)   # None -> nan: gap in the line
+    set_hours  = np.array(set_hours,  dtype=float)
+
+    ax, lines = plot_window("Moonrise/Moonset", (10,5))
+    if not lines:
+        lines['rise'], = ax.plot(days, rise_hours, marker='o', label='Moonrise', color='blue')
+        lines['set'],  = ax.plot(days, set_hours,  marker='o', label='Moonset',  color='red')
+        ax.set_title('Moonrise and Moonset Times')
+        ax.set_xlabel('Day in Lunar Cycle')
+        ax.set_ylabel('Time of Day (Hours)')
+        ax.set_yticks(range(0, 25, 2))
+        ax.set_ylim(0, 24)
+        ax.grid(True)
+        ax.legend()
+    else:
+        lines['rise'].set_data(days, rise_hours)
+        lines['set'].set_data(days, set_hours)
+    ax.set_xticks(range(1, max(days)+1))
+    show_plot(ax)
 
 def plot_moon_schedule_phases(schedule):
     days = []
@@ -276,14 +228,17 @@ def plot_moon_schedule_phases(schedule):
             p_idx = -1
         phase_indices.append(p_idx)
 
-    plt.figure(figsize=(10,4))
-    plt.scatter(days, phase_indices, marker='o', color='green')
-    plt.yticks(range(len(LUNAR_PHASES)), LUNAR_PHASES)
-    plt.xlabel("Day in Lunar Cycle")
-    plt.ylabel("Lunar Phase")
-    plt.title("Lunar Phase by Day")
-    plt.grid(True)
-    plt.show(block=False)
+    ax, lines = plot_window("Lunar Phases", (10,4))
+    if not lines:
+        lines['phase'], = ax.plot(days, phase_indices, linestyle='none', marker='o', color='green')
+        ax.set_yticks(range(len(LUNAR_PHASES)), LUNAR_PHASES)
+        ax.set_xlabel("Day in Lunar Cycle")
+        ax.set_ylabel("Lunar Phase")
+        ax.set_title("Lunar Phase by Day")
+        ax.grid(True)
+    else:
+        lines['phase'].set_data(days, phase_indices)
+    show_plot(ax)
 
 def plot_hourly_altitude(schedule_entry, cycle_start_date, marker_interval=60):
     mr = schedule_entry['moonrise_time']
@@ -308,22 +263,27 @@ def plot_hourly_altitude(schedule_entry, cycle_start_date, marker_interval=60):
         altitudes.append(alt)
         current += datetime.timedelta(minutes=marker_interval)
 
-    plt.figure(figsize=(10,5))
-    plt.plot(time_points, altitudes, color='purple')
-    plt.scatter(time_points, altitudes, color='red', s=20)
-    plt.title(f"Hourly Altitude (Day {schedule_entry['day']} - {schedule_entry['phase']})")
-    plt.xlabel("Time")
-    plt.ylabel("Altitude (degrees)")
-
-    hours = mdates.HourLocator()
-    fmt   = mdates.DateFormatter('%H:%M')
-    plt.gca().xaxis.set_major_locator(hours)
-    plt.gca().xaxis.set_major_formatter(fmt)
-    plt.gcf().autofmt_xdate()
-
-    plt.ylim(0, 200)
-    plt.grid(True, alpha=0.3)
-    plt.show(block=False)
+    ax, lines = plot_window(f"Altitude (Day {schedule_entry['day']})", (10,5))
+    if not lines:
+        lines['curve'],   = ax.plot(time_points, altitudes, color='purple')
+        lines['markers'], = ax.plot(time_points, altitudes, linestyle='none', marker='o',
+                                    markersize=4.5, color='red')
+        ax.set_xlabel("Time")
+        ax.set_ylabel("Altitude (degrees)")
+
+        hours = mdates.HourLocator()
+        fmt   = mdates.DateFormatter('%H:%M')
+        ax.xaxis.set_major_locator(hours)
+        ax.xaxis.set_major_formatter(fmt)
+        ax.figure.autofmt_xdate()
+
+        ax.set_ylim(0, 200)
+        ax.grid(True, alpha=0.3)
+    else:
+        lines['curve'].set_data(time_points, altitudes)
+        lines['markers'].set_data(time_points, altitudes)
+    ax.set_title(f"Hourly Altitude (Day {schedule_entry['day']} - {schedule_entry['phase']})")
+    show_plot(ax)
 
 
 def user_input_thread(command_queue):
@@ -414,6 +374,9 @@ def handle_command(cmd, arg, schedule, cycle_start_date, stop_event):
         else:
             print("Please enter a valid integer for the day index.")
 
+    elif cmd == 'pc':
+        close_plot_windows()
+
     elif cmd == 'q':
         print("[Main Thread] User requested quit.")
         stop_event.set()
@@ -446,7 +409,7 @@ def main():
         day_length_in_real_seconds = 86400.0
 
     # queue for commands, plus a user-input thread
-    command_queue = Queue()
+    command_queue = CommandQueue()
     input_thread = threading.Thread(target=user_input_thread, args=(command_queue,), daemon=True)
     input_thread.start()
 
@@ -475,24 +438,18 @@ def main():
           "  pp  -> plot moon schedule phases\n"
           "  pi  -> plot moon irradiances\n"
           "  pa  -> plot hourly altitude for a specific day\n"
+          "  pc  -> close all plot windows\n"
           "  q   -> quit simulation\n"
           "Hit Enter to send commands.\n")
 
-    # main loop does commands and do small sleeps
+    # main loop sleeps until a command arrives ('q' sets stop_event)
     while not stop_event.is_set():
-        # do any pending commands
-        while not command_queue.empty():
-            cmd, arg = command_queue.get()
-            handle_command(cmd, arg, moon_schedule, cycle_start_date, stop_event)
-
-        
-        plt.pause(0.01)
-
-
-        time.sleep(0.1)
+        cmd, arg = next_command(command_queue)
+        handle_command(cmd, arg, moon_schedule, cycle_start_date, stop_event)
 
     # the user typed 'q' or simulation ended join the sim thread.
     sim_thread.join()
+    close_plot_windows()
     print("[Main Thread] Simulation thread joined. Exiting.")
 
 
@@ -0,0 +1,67 @@
+"""
+Resuming a checkpoint catches the run up on the time the engine was down.
+
+    python -m pytest tests
+"""
+import datetime
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "Final"))
+
+from checkpoint import Checkpointer, checkpoint_path, load_checkpoint
+from simulator import get_schedule
+
+CYCLE_START = datetime.datetime(2025, 1, 1, 18, 0)
+
+
+def save(tmp_path, sim_time, speed_factor=1.0, day_length=86400, cycle_length=28):
+    run = {
+        "schedule":                   get_schedule(cycle_length, "Full Moon"),
+        "cycle_start_date":           CYCLE_START,
+        "user_cycle_length":          cycle_length,
+        "speed_factor":               speed_factor,
+        "day_length_in_real_seconds": day_length,
+        "hex_color":                  "FF0000",
+    }
+    path = checkpoint_path(str(tmp_path), "default")
+    checkpoint = Checkpointer(path, run)
+    checkpoint.update(sim_time, 30.0, 25.0, force=True)
+    checkpoint.close()
+    with open(path) as f:
+        written_at = datetime.datetime.fromisoformat(json.load(f)["written_at"])
+    return path, written_at
+
+
+def test_resume_adds_downtime(tmp_path):
+    sim_time = CYCLE_START + datetime.timedelta(days=3, hours=2)
+    path, written_at = save(tmp_path, sim_time)
+    run, resume = load_checkpoint(path, now=written_at + datetime.timedelta(minutes=7))
+    assert resume["saved_sim_time"] == sim_time
+    assert resume["sim_time"] == sim_time + datetime.timedelta(minutes=7)
+    assert (resume["arm_angle"], resume["feeder_angle"]) == (30.0, 25.0)
+
+
+def test_resume_downtime_at_run_pace(tmp_path):
+    # 10x speed on a 1 h sim day: 240 sim minutes per real minute
+    sim_time = CYCLE_START + datetime.timedelta(days=1)
+    path, written_at = save(tmp_path, sim_time, speed_factor=10.0, day_length=3600)
+    _, resume = load_checkpoint(path, now=written_at + datetime.timedelta(minutes=5))
+    assert resume["sim_time"] == sim_time + datetime.timedelta(minutes=5 * 240)
+
+
+def test_resume_clamped_to_cycle_end(tmp_path):
+    sim_time = CYCLE_START + datetime.timedelta(days=27)
+    path, written_at = save(tmp_path, sim_time)
+    _, resume = load_checkpoint(path, now=written_at + datetime.timedelta(days=5))
+    cycle_end = CYCLE_START + datetime.timedelta(days=28)
+    assert resume["sim_time"] == cycle_end - datetime.timedelta(minutes=1)
+
+
+def test_resume_ignores_clock_set_back(tmp_path):
+    sim_time = CYCLE_START + datetime.timedelta(days=2)
+    path, written_at = save(tmp_path, sim_time)
+    _, resume = load_checkpoint(path, now=written_at - datetime.timedelta(hours=1))
+    assert resume["sim_time"] == sim_time